@@ -0,0 +1,65 @@
+"""
+Throughput of sending many small messages over local socketpair: one sendall() per
+message vs BatchWriter scatter-gather sendmsg().
+
+Run from repository root: python -m bench.batch
+"""
+import socket
+import threading
+
+from netxms.batch import BatchWriter
+
+from .common import build_message, measure, print_table
+
+MESSAGE_COUNT = 10000
+FIELD_COUNTS = (1, 10, 50)
+
+
+class Sink():
+    """Socketpair with background thread reading and discarding everything sent to it"""
+
+    def __init__(self):
+        (self.sock, self._peer) = socket.socketpair()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        buffer = bytearray(1 << 20)
+        while self._peer.recv_into(buffer):
+            pass
+
+    def close(self):
+        self.sock.close()
+        self._thread.join()
+        self._peer.close()
+
+
+def main():
+    sink = Sink()
+    rows = []
+    try:
+        for field_count in FIELD_COUNTS:
+            messages = [build_message(field_count) for _ in range(MESSAGE_COUNT)]
+            size = len(messages[0].serialize()) * MESSAGE_COUNT
+
+            def send_each():
+                for m in messages:
+                    sink.sock.sendall(m.serialize())
+
+            def send_batched():
+                writer = BatchWriter(sink.sock)
+                writer.add_all(messages)
+                writer.flush()
+
+            each = measure(send_each)
+            batched = measure(send_batched)
+            rows.append((field_count, MESSAGE_COUNT,
+                '%.0f' % (MESSAGE_COUNT / each), '%.0f' % (MESSAGE_COUNT / batched),
+                '%.1f' % (size / batched / 1e6), '%.1fx' % (each / batched)))
+    finally:
+        sink.close()
+    print_table(('fields', 'messages', 'sendall msg/s', 'batched msg/s', 'batched MB/s', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
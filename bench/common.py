@@ -0,0 +1,48 @@
+import time
+
+import netxms
+
+
+def build_message(field_count, kind='mixed', message_code=100):
+    m = netxms.Message(message_code, 1)
+    for i in range(field_count):
+        field_id = 1000 + i
+        if kind == 'integer' or (kind == 'mixed' and i % 4 == 0):
+            m.set(field_id, i)
+        elif kind == 'int64' or (kind == 'mixed' and i % 4 == 1):
+            m.set_int64(field_id, i * 1000000007)
+        elif kind == 'float' or (kind == 'mixed' and i % 4 == 2):
+            m.set(field_id, i / 3.0)
+        else:
+            m.set(field_id, 'Object name %d' % i)
+    return m
+
+
+def uncached(message, func):
+    """Wrap func so that it runs with serialized form of message not cached"""
+    def call(*args, **kwargs):
+        message.invalidate_cache()
+        return func(*args, **kwargs)
+    return call
+
+
+def measure(func, min_time=0.2, min_rounds=3):
+    """Return best time of a single call to func, in seconds"""
+    best = None
+    rounds = 0
+    started = time.perf_counter()
+    while rounds < min_rounds or time.perf_counter() - started < min_time:
+        t = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t
+        if best is None or elapsed < best:
+            best = elapsed
+        rounds += 1
+    return best
+
+
+def print_table(header, rows):
+    widths = [max(len(str(r[i])) for r in [header] + rows) for i in range(len(header))]
+    print('  '.join(str(h).rjust(w) for h, w in zip(header, widths)))
+    for r in rows:
+        print('  '.join(str(c).rjust(w) for c, w in zip(r, widths)))
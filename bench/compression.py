@@ -0,0 +1,48 @@
+"""
+Compression benchmark: bytes on the wire and CPU time for object-list payloads.
+
+Run from repository root: python -m bench.compression
+"""
+import netxms
+
+from .common import measure, print_table, uncached
+
+OBJECT_COUNTS = (10, 100, 1000, 10000)
+FIELDS_PER_OBJECT = 10
+
+
+def build_object_list(count):
+    """Object list reply similar to server's: names, classes, ids, statuses and addresses"""
+    m = netxms.Message(0x1C, 1)
+    m.set(1, count)
+    for i in range(count):
+        base = 0x10000000 + i * FIELDS_PER_OBJECT
+        m.set(base, i + 100)
+        m.set(base + 1, 'node-%05d.example.com' % i)
+        m.set(base + 2, ('Node', 'Interface', 'Container', 'Subnet')[i % 4])
+        m.set(base + 3, i % 5)
+        m.set_int64(base + 4, 1600000000 + i)
+        m.set(base + 5, 'Comment for object %d' % (i % 50))
+        m.set(base + 6, '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255))
+        m.set_int16(base + 7, 1)
+    return m
+
+
+def main():
+    rows = []
+    for count in OBJECT_COUNTS:
+        m = build_object_list(count)
+        plain = m.serialize()
+        compressed = m.serialize(compression_threshold=128)
+        encode = measure(uncached(m, m.serialize))
+        encode_compressed = measure(uncached(m, lambda: m.serialize(compression_threshold=128)))
+        decode = measure(lambda: netxms.Message.from_binary(plain))
+        decode_compressed = measure(lambda: netxms.Message.from_binary(compressed))
+        rows.append((count, len(plain), len(compressed), '%.1f%%' % (100.0 * len(compressed) / len(plain)),
+            '%.3f' % (encode * 1000), '%.3f' % (encode_compressed * 1000),
+            '%.3f' % (decode * 1000), '%.3f' % (decode_compressed * 1000)))
+    print_table(('objects', 'bytes', 'compressed', 'ratio', 'enc ms', 'enc+z ms', 'dec ms', 'dec+z ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
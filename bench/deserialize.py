@@ -0,0 +1,33 @@
+"""
+Message.deserialize scaling benchmark.
+
+Run from repository root: python -m bench.deserialize
+Time per field should stay flat as the field count grows. Lazy columns show
+scanning only field headers and then reading 5 fields.
+"""
+import netxms
+
+from .common import build_message, measure, print_table
+
+FIELD_COUNTS = (10, 100, 1000, 10000, 100000)
+
+
+def read_lazy(data, count):
+    m = netxms.Message.from_binary(data, lazy=True)
+    for i in range(0, count, max(count // 5, 1)):
+        m.get(1000 + i)
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        data = build_message(count).serialize()
+        elapsed = measure(lambda: netxms.Message.from_binary(data))
+        elapsed_lazy = measure(lambda: read_lazy(data, count))
+        rows.append((count, len(data), '%.3f' % (elapsed * 1000), '%.3f' % (elapsed * 1e6 / count),
+            '%.1f' % (len(data) / elapsed / 1e6), '%.3f' % (elapsed_lazy * 1000)))
+    print_table(('fields', 'bytes', 'ms/msg', 'us/field', 'MB/s', 'lazy+5 get ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Memory used per decoded field, measured with tracemalloc.
+
+Run from repository root: python -m bench.memory
+"dict" column decodes into MessageField subclass with instance __dict__ (layout
+before __slots__ were introduced) for comparison.
+"""
+import tracemalloc
+
+import netxms
+from netxms.message import MessageField
+
+from .common import build_message, print_table
+
+FIELD_COUNTS = (1000, 10000, 100000)
+
+
+class DictMessageField(MessageField):
+    pass
+
+
+def allocated(func):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+
+def decode_with(field_class, data):
+    fields = {}
+    count = int.from_bytes(data[12:16], 'big')
+    offset = netxms.Message.HEADER_SIZE
+    with memoryview(data) as view:
+        for _ in range(count):
+            (field, offset) = field_class.unpack_from(view, offset)
+            fields[field.field_id] = field
+    return fields
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        data = build_message(count, 'integer').serialize()
+        dict_fields = allocated(lambda: decode_with(DictMessageField, data))
+        slot_fields = allocated(lambda: netxms.Message.from_binary(data))
+        lazy = allocated(lambda: netxms.Message.from_binary(data, lazy=True))
+        rows.append((count, '%.1f' % (dict_fields / count), '%.1f' % (slot_fields / count), '%.1f' % (lazy / count)))
+    print_table(('fields', 'dict bytes/field', 'slots bytes/field', 'lazy bytes/field'), rows)
+
+
+if __name__ == '__main__':
+    main()
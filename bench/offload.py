@@ -0,0 +1,81 @@
+"""
+Event loop stalls while decoding and encoding large messages: inline from_binary and
+serialize vs from_binary_async and serialize_async with thread pool and process pool.
+Ticker task expects to wake up every millisecond and records how late it was.
+
+Run from repository root: python -m bench.offload
+"""
+import asyncio
+import concurrent.futures
+import time
+
+import netxms
+
+from .common import build_message, print_table
+
+FIELD_COUNT = 50000
+STRING_LENGTH = 5 * 1024 * 1024
+MESSAGE_COUNT = 5
+TICK = 0.001
+
+
+async def ticker(stalls, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(time.perf_counter() - started - TICK)
+
+
+async def run(operation):
+    stalls = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(stalls, stop))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    for _ in range(MESSAGE_COUNT):
+        await operation()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    stalls.sort()
+    return (elapsed, stalls[-1], stalls[int(len(stalls) * 0.99)])
+
+
+async def main_async():
+    many_fields = build_message(FIELD_COUNT)
+    large_string = netxms.Message(100, 1)
+    large_string.set(1, 'x' * STRING_LENGTH)
+    messages = (('%d fields' % FIELD_COUNT, many_fields), ('1 string field', large_string))
+
+    rows = []
+    with concurrent.futures.ThreadPoolExecutor(1) as threads, concurrent.futures.ProcessPoolExecutor(1) as processes:
+        # start worker process before measuring
+        processes.submit(len, b'').result()
+        for (description, m) in messages:
+            data = m.serialize()
+            cases = (
+                ('decode', 'inline', lambda: inline(netxms.Message.from_binary, data)),
+                ('decode', 'thread pool', lambda: netxms.Message.from_binary_async(data, executor=threads)),
+                ('decode', 'process pool', lambda: netxms.Message.from_binary_async(data, executor=processes)),
+                ('encode', 'inline', lambda: inline(m.serialize)),
+                ('encode', 'thread pool', lambda: m.serialize_async(executor=threads)),
+                ('encode', 'process pool', lambda: m.serialize_async(executor=processes)),
+            )
+            for (operation, name, func) in cases:
+                (elapsed, worst, p99) = await run(func)
+                rows.append(('%s, %d bytes' % (description, len(data)), operation, name,
+                    '%.1f' % (elapsed * 1000 / MESSAGE_COUNT), '%.1f' % (worst * 1000), '%.1f' % (p99 * 1000)))
+    print('%d messages per case' % MESSAGE_COUNT)
+    print_table(('message', 'operation', 'mode', 'ms/message', 'max stall ms', 'p99 stall ms'), rows)
+
+
+async def inline(func, *args):
+    return func(*args)
+
+
+def main():
+    asyncio.run(main_async())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Parallel capture file decoding (netxms.decode) with growing number of worker processes.
+
+Run from repository root: python -m bench.parallel
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from netxms.decode import file_stats
+
+from .common import build_message, print_table
+
+MESSAGE_COUNT = 20000
+FIELD_COUNT = 50
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'capture.nxcp')
+        data = build_message(FIELD_COUNT).serialize()
+        with open(path, 'wb') as f:
+            for _ in range(MESSAGE_COUNT):
+                f.write(data)
+        size = os.path.getsize(path)
+
+        rows = []
+        cpus = os.cpu_count() or 1
+        counts = sorted(set([1, 2, 4, 8, 16, cpus]))
+        single = None
+        for workers in counts:
+            if workers > max(cpus, 2):
+                break
+            started = time.perf_counter()
+            file_stats(path, workers, chunk_size=size // (workers * 8) + 1)
+            elapsed = time.perf_counter() - started
+            if single is None:
+                single = elapsed
+            rows.append((workers, '%.2f' % elapsed, '%.0f' % (MESSAGE_COUNT / elapsed), '%.1f' % (size / elapsed / 1e6),
+                '%.2fx' % (single / elapsed)))
+    finally:
+        shutil.rmtree(directory)
+    print('%d messages, %d bytes, %d CPUs' % (MESSAGE_COUNT, size, cpus))
+    print_table(('workers', 'seconds', 'msg/s', 'MB/s', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Receiving high-rate event stream with and without MessagePool: throughput and time
+spent in garbage collector.
+
+Run from repository root: python -m bench.pool
+"""
+import gc
+import time
+
+import netxms
+
+from .common import build_message, print_table
+
+MESSAGE_COUNT = 50000
+FIELD_COUNTS = (2, 10)
+CHUNK = 64 * 1024
+
+
+class GCTimer():
+    """Accumulates time spent in garbage collection using gc.callbacks"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.collections = 0
+        self._started = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.seconds += time.perf_counter() - self._started
+            self.collections += 1
+            self._started = None
+
+
+def receive(data, pool, lazy):
+    timer = GCTimer()
+    reader = netxms.MessageReader(pool=pool, lazy=lazy)
+    gc.callbacks.append(timer)
+    try:
+        started = time.perf_counter()
+        total = 0
+        with memoryview(data) as view:
+            for offset in range(0, len(view), CHUNK):
+                # messages are queued and handled in batches, like notifications in Session
+                batch = list(reader.feed(view[offset:offset + CHUNK]))
+                for message in batch:
+                    with message:
+                        total += message.get(1000).value
+                del batch
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.callbacks.remove(timer)
+    return (elapsed, timer)
+
+
+def main():
+    # long-lived objects make collections cost as much as in real application
+    heap = [{'key': i} for i in range(200000)]
+    rows = []
+    for field_count in FIELD_COUNTS:
+        data = build_message(field_count).serialize() * MESSAGE_COUNT
+        for lazy in (False, True):
+            results = []
+            for pool in (None, netxms.MessagePool()):
+                results.append(min((receive(data, pool, lazy) for _ in range(3)), key=lambda r: r[0]))
+            ((plain, plain_gc), (pooled, pooled_gc)) = results
+            rows.append((field_count, 'lazy' if lazy else 'eager',
+                '%.0f' % (MESSAGE_COUNT / plain), '%.0f' % (MESSAGE_COUNT / pooled), '%.2fx' % (plain / pooled),
+                '%d' % plain_gc.collections, '%d' % pooled_gc.collections,
+                '%.1f' % (plain_gc.seconds * 1000), '%.1f' % (pooled_gc.seconds * 1000)))
+    del heap
+    print_table(('fields', 'mode', 'msg/s', 'pooled msg/s', 'speedup', 'GCs', 'pooled GCs', 'GC ms', 'pooled GC ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Bulk range access (get_range/set_range) vs field by field access.
+
+Run from repository root: python -m bench.ranges
+"""
+import tracemalloc
+
+import netxms
+from netxms.message import FieldType
+
+from .common import measure, print_table
+
+COUNTS = (1000, 10000, 100000)
+BASE_ID = 0x10000000
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    rows = []
+    for count in COUNTS:
+        values = [i * 1000003 for i in range(count)]
+        m = netxms.Message(0x1C, 1)
+        m.set_range(BASE_ID, values, FieldType.INT64)
+        data = m.serialize()
+
+        def encode_fields():
+            m = netxms.Message(0x1C, 1)
+            for (i, v) in enumerate(values):
+                m.set_int64(BASE_ID + i, v)
+            return m.serialize()
+
+        def encode_range():
+            m = netxms.Message(0x1C, 1)
+            m.set_range(BASE_ID, values, FieldType.INT64)
+            return m.serialize()
+
+        def decode_fields():
+            m = netxms.Message.from_binary(data)
+            return [m.get(BASE_ID + i).value for i in range(count)]
+
+        def decode_range():
+            return netxms.Message.from_binary(data, lazy=True).get_range(BASE_ID, count, FieldType.INT64)
+
+        rows.append((count,
+            '%.2f' % (measure(encode_fields) * 1000), '%.2f' % (measure(encode_range) * 1000),
+            '%.2f' % (measure(decode_fields) * 1000), '%.2f' % (measure(decode_range) * 1000),
+            '%.1f' % (peak_memory(decode_fields) / 1e6), '%.1f' % (peak_memory(decode_range) / 1e6)))
+    print_table(('values', 'set ms', 'set_range ms', 'get ms', 'get_range ms', 'get peak MB', 'get_range peak MB'), rows)
+
+
+if __name__ == '__main__':
+    main()
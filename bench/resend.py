@@ -0,0 +1,38 @@
+"""
+Resending one message with different id: cached serialized form with header
+patching vs full encoding on every call.
+
+Run from repository root: python -m bench.resend
+"""
+from .common import build_message, measure, print_table
+
+FIELD_COUNTS = (1, 10, 100, 1000)
+SENDS = 10000
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        m = build_message(count)
+        m.cache = True
+
+        def full():
+            for message_id in range(SENDS):
+                m.message_id = message_id
+                m.invalidate_cache()
+                m.serialize()
+
+        def cached():
+            for message_id in range(SENDS):
+                m.message_id = message_id
+                m.serialize()
+
+        full_time = measure(full)
+        cached_time = measure(cached)
+        rows.append((count, m.serialized_size(), '%.2f' % (full_time * 1000), '%.2f' % (cached_time * 1000),
+            '%.1fx' % (full_time / cached_time)))
+    print_table(('fields', 'bytes', '%d x encode ms' % SENDS, '%d x cached ms' % SENDS, 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
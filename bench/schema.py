@@ -0,0 +1,55 @@
+"""
+Compiled schema vs generic encoder for all-integer messages.
+
+Run from repository root: python -m bench.schema
+"""
+import netxms
+from netxms.message import FieldType
+from netxms.schema import MessageSchema
+
+from .common import measure, print_table
+
+FIELD_COUNTS = (1, 4, 16, 64)
+ROUNDS = 1000
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        ids = [1000 + i for i in range(count)]
+        values = list(range(count))
+        schema = MessageSchema(100, [(i, FieldType.INTEGER) for i in ids])
+
+        def generic():
+            for n in range(ROUNDS):
+                m = netxms.Message(100, n)
+                for (field_id, value) in zip(ids, values):
+                    m.set(field_id, value)
+                m.serialize()
+
+        def compiled():
+            for n in range(ROUNDS):
+                schema.encode(values, n)
+
+        data = schema.encode(values, 1)
+
+        def generic_decode():
+            for _ in range(ROUNDS):
+                m = netxms.Message.from_binary(data)
+                [m.get(i).value for i in ids]
+
+        def compiled_decode():
+            for _ in range(ROUNDS):
+                schema.decode(data)
+
+        t_generic = measure(generic) / ROUNDS
+        t_compiled = measure(compiled) / ROUNDS
+        t_generic_decode = measure(generic_decode) / ROUNDS
+        t_compiled_decode = measure(compiled_decode) / ROUNDS
+        rows.append((count, '%.2f' % (t_generic * 1e6), '%.2f' % (t_compiled * 1e6), '%.1fx' % (t_generic / t_compiled),
+            '%.2f' % (t_generic_decode * 1e6), '%.2f' % (t_compiled_decode * 1e6), '%.1fx' % (t_generic_decode / t_compiled_decode)))
+    print_table(('fields', 'set+serialize us', 'schema us', 'speedup', 'decode us', 'schema decode us', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+Message.serialize / serialize_into scaling benchmark.
+
+Run from repository root: python -m bench.serialize
+"""
+from .common import build_message, measure, print_table, uncached
+
+FIELD_COUNTS = (10, 100, 1000, 10000, 100000)
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        m = build_message(count)
+        size = m.serialized_size()
+        buffer = bytearray(size)
+        elapsed = measure(uncached(m, m.serialize))
+        elapsed_into = measure(uncached(m, lambda: m.serialize_into(buffer)))
+        rows.append((count, size, '%.3f' % (elapsed * 1000), '%.3f' % (elapsed * 1e6 / count),
+            '%.3f' % (elapsed_into * 1000), '%.1f' % (size / elapsed / 1e6)))
+    print_table(('fields', 'bytes', 'ms/msg', 'us/field', 'into ms/msg', 'MB/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Decoding object list with repeated names with and without StringCache: time and
+memory retained by decoded message.
+
+Run from repository root: python -m bench.strings
+"""
+import tracemalloc
+
+import netxms
+from netxms.message import StringCache, set_string_cache
+
+from .common import measure, print_table
+
+FIELD_COUNTS = (1000, 10000, 100000)
+DISTINCT = 200
+
+
+def build_object_list(count):
+    m = netxms.Message(100, 1)
+    for i in range(count):
+        m.set(1000 + i, 'Object class %d / attribute %d' % (i % DISTINCT, i % 7))
+    return m
+
+
+def retained_memory(data):
+    tracemalloc.start()
+    try:
+        message = netxms.Message.from_binary(data)
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del message
+    return retained
+
+
+def main():
+    rows = []
+    for count in FIELD_COUNTS:
+        data = build_object_list(count).serialize()
+        plain = measure(lambda: netxms.Message.from_binary(data))
+        plain_memory = retained_memory(data)
+        cache = StringCache()
+        previous = set_string_cache(cache)
+        try:
+            cached = measure(lambda: netxms.Message.from_binary(data))
+            cached_memory = retained_memory(data)
+        finally:
+            set_string_cache(previous)
+        rows.append((count, '%.2f' % (plain * 1000), '%.2f' % (cached * 1000), '%.2fx' % (plain / cached),
+            '%.1f' % (plain_memory / 1e6), '%.1f' % (cached_memory / 1e6),
+            '%.1f%%' % (100.0 * cache.hits / (cache.hits + cache.misses))))
+    print_table(('fields', 'decode ms', 'cached ms', 'speedup', 'retained MB', 'cached MB', 'hit rate'), rows)
+
+
+if __name__ == '__main__':
+    main()
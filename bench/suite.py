@@ -0,0 +1,163 @@
+"""
+Codec benchmark suite with regression gate.
+
+Run from repository root:
+    make bench              run suite, compare with bench/baseline.json if it exists
+    make bench-baseline     store current results as baseline
+
+or directly: python -m bench.suite [--quick] [--output FILE] [--baseline FILE] [--threshold 0.25]
+
+Every case reports best-of time for encode and decode, messages/s, MB/s and peak
+decode memory; per-field time across field counts gives scaling curve for each type.
+Exit status is 1 if any case is slower than baseline by more than threshold.
+"""
+import argparse
+import ipaddress
+import json
+import os
+import platform
+import sys
+import tracemalloc
+
+import netxms
+from netxms.message import FieldType
+
+from .common import measure, print_table, uncached
+
+FIELD_COUNTS = (1, 10, 100, 1000, 10000, 100000)
+QUICK_FIELD_COUNTS = (1, 10, 100, 1000)
+BINARY_SIZES = (1024, 1024 * 1024)
+FIELD_TYPES = (FieldType.INTEGER, FieldType.STRING, FieldType.INT64, FieldType.INT16,
+    FieldType.BINARY, FieldType.FLOAT, FieldType.INETADDR)
+
+
+def sample_value(field_type, i):
+    if field_type == FieldType.INTEGER:
+        return i
+    elif field_type == FieldType.STRING:
+        return 'Object name %d' % i
+    elif field_type == FieldType.INT64:
+        return i * 1000000007
+    elif field_type == FieldType.INT16:
+        return i & 0xFFFF
+    elif field_type == FieldType.BINARY:
+        return i.to_bytes(4, 'big') * 4
+    elif field_type == FieldType.FLOAT:
+        return i / 3.0
+    return ipaddress.IPv4Network(i & 0xFFFFFFFF)
+
+
+def build_cases(field_counts):
+    cases = []
+    for field_type in FIELD_TYPES:
+        for count in field_counts:
+            m = netxms.Message(100, 1)
+            for i in range(count):
+                m.set(1000 + i, sample_value(field_type, i), field_type)
+            cases.append(('%s/%d' % (field_type.name.lower(), count), m, count))
+    m = netxms.Message(100, 1)
+    m.control_data = 200
+    cases.append(('control-message', m, 0))
+    for size in BINARY_SIZES:
+        m = netxms.Message(100, 1)
+        m.binary_data = os.urandom(size)
+        cases.append(('binary-message/%d' % size, m, 0))
+    return cases
+
+
+def peak_decode_memory(data):
+    tracemalloc.start()
+    try:
+        message = netxms.Message.from_binary(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del message
+    return peak
+
+
+def run(field_counts, min_time):
+    results = {}
+    for (name, message, count) in build_cases(field_counts):
+        data = message.serialize()
+        encode = measure(uncached(message, message.serialize), min_time)
+        decode = measure(lambda: netxms.Message.from_binary(data), min_time)
+        results[name] = {
+            'fields': count,
+            'bytes': len(data),
+            'encode_s': encode,
+            'decode_s': decode,
+            'encode_msgs_per_s': 1.0 / encode,
+            'decode_msgs_per_s': 1.0 / decode,
+            'encode_mb_per_s': len(data) / encode / 1e6,
+            'decode_mb_per_s': len(data) / decode / 1e6,
+            'decode_peak_bytes': peak_decode_memory(data),
+        }
+    return results
+
+
+def report(results):
+    rows = []
+    for (name, r) in results.items():
+        per_field = ('%.3f' % (r['encode_s'] * 1e6 / r['fields']), '%.3f' % (r['decode_s'] * 1e6 / r['fields'])) if r['fields'] else ('-', '-')
+        rows.append((name, r['bytes'], '%.0f' % r['encode_msgs_per_s'], '%.1f' % r['encode_mb_per_s'],
+            '%.0f' % r['decode_msgs_per_s'], '%.1f' % r['decode_mb_per_s']) + per_field + (r['decode_peak_bytes'],))
+    print_table(('case', 'bytes', 'enc msg/s', 'enc MB/s', 'dec msg/s', 'dec MB/s', 'enc us/field', 'dec us/field', 'dec peak B'), rows)
+
+
+def compare(results, baseline, threshold):
+    """Print speedups relative to baseline and cases slower by more than threshold, return their number"""
+    changes = []
+    regressions = []
+    for (name, r) in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        changes.append((name, '%.2fx' % (base['encode_s'] / r['encode_s']), '%.2fx' % (base['decode_s'] / r['decode_s'])))
+        for key in ('encode_s', 'decode_s'):
+            ratio = r[key] / base[key]
+            if ratio > 1.0 + threshold:
+                regressions.append((name, key, '%.6f' % base[key], '%.6f' % r[key], '+%.0f%%' % ((ratio - 1) * 100)))
+    if changes:
+        print('\nSpeedup relative to baseline:')
+        print_table(('case', 'encode', 'decode'), changes)
+    if regressions:
+        print('\nRegressions over %.0f%% threshold:' % (threshold * 100))
+        print_table(('case', 'metric', 'baseline', 'current', 'change'), regressions)
+    else:
+        print('\nNo regressions over %.0f%% threshold' % (threshold * 100))
+    return len(regressions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NXCP codec benchmark suite')
+    parser.add_argument('--quick', action='store_true', help='only up to %d fields per message' % QUICK_FIELD_COUNTS[-1])
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal measuring time per case, seconds')
+    parser.add_argument('--output', help='write results to JSON file')
+    parser.add_argument('--baseline', help='compare with results stored in JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown relative to baseline (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    results = run(QUICK_FIELD_COUNTS if args.quick else FIELD_COUNTS, args.min_time)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'version': netxms.VERSION,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print('\nBaseline %s not found, run "make bench-baseline" to create it' % args.baseline)
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold) > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,5 @@
-from .message import Message
+from .message import DecodeError, DecodeLimits, Message, MessagePool
+from .reader import MessageReader
+from .session import Session
 
 VERSION = "2.2.12"
@@ -0,0 +1,86 @@
+import os
+import time
+
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 16
+
+def serialize_batch(messages, compression_threshold=None):
+    """Serialize messages into list of separate buffer segments, without joining them"""
+    return [m.serialize(compression_threshold) for m in messages]
+
+def write_messages(transport, messages, compression_threshold=None):
+    """Write messages to asyncio transport or StreamWriter with single writelines() call"""
+    transport.writelines(serialize_batch(messages, compression_threshold))
+
+class BatchWriter():
+    """
+    Coalesce serialized messages and send them with scatter-gather socket.sendmsg().
+    Messages are sent once max_bytes are queued or oldest queued message waits longer
+    than max_delay seconds (checked when messages are added, call flush() to send rest).
+    With non-blocking socket unsent data stays queued; add() returns False while more
+    than high_water bytes are queued, so producer should wait for socket to become writable.
+    """
+
+    def __init__(self, sock, max_bytes=65536, max_delay=0.005, high_water=4 * 1024 * 1024, compression_threshold=None):
+        self.sock = sock
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.high_water = high_water
+        self.compression_threshold = compression_threshold
+        self._segments = []
+        self._pending = 0
+        self._since = None
+        self._sendmsg = getattr(sock, 'sendmsg', None)
+
+    @property
+    def pending(self):
+        """Number of queued bytes not sent yet"""
+        return self._pending
+
+    def add(self, message):
+        """Queue message, send queue if size or time budget is exhausted; return False if above high water mark"""
+        segment = message.serialize(self.compression_threshold)
+        self._segments.append(segment)
+        self._pending += len(segment)
+        if self._since is None:
+            self._since = time.monotonic()
+        if self._pending >= self.max_bytes or time.monotonic() - self._since >= self.max_delay:
+            self.flush()
+        return self._pending <= self.high_water
+
+    def add_all(self, messages):
+        for message in messages:
+            self.add(message)
+        return self._pending <= self.high_water
+
+    def flush(self):
+        """Send queued data, return True if everything was sent (False if socket would block)"""
+        try:
+            while self._segments:
+                segments = self._segments[:_IOV_MAX]
+                if self._sendmsg is not None:
+                    sent = self._sendmsg(segments)
+                else:
+                    sent = self.sock.send(segments[0])
+                self._consume(sent)
+        except (BlockingIOError, InterruptedError):
+            return False
+        self._since = None
+        return True
+
+    def _consume(self, sent):
+        """Drop sent bytes from queue; partially sent segment is replaced by its unsent tail"""
+        self._pending -= sent
+        segments = self._segments
+        count = 0
+        for segment in segments:
+            length = len(segment)
+            if sent < length:
+                break
+            sent -= length
+            count += 1
+        del segments[:count]
+        if sent > 0:
+            segments[0] = memoryview(segments[0])[sent:]
@@ -0,0 +1,170 @@
+"""
+Parallel decoding of NXCP capture files (serialized messages stored one after another,
+e.g. message log data file). Frame boundaries are found from message headers only,
+then chunks of frames are decoded by worker processes, each mapping the file with mmap.
+
+Command line: python -m netxms.decode [--workers N] [--dump] FILE
+"""
+import argparse
+import collections
+import concurrent.futures
+import mmap
+import os
+import struct
+import sys
+
+from .message import Flags, Message
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+_FRAME_HEADER = struct.Struct('!HHI')
+_NO_FIELDS = Flags.BINARY | Flags.CONTROL
+
+def scan_frames(buffer, start=0, end=None):
+    """Return list of (offset, size) of messages in buffer, reading only message headers"""
+    if end is None:
+        end = len(buffer)
+    frames = []
+    offset = start
+    while offset < end:
+        if end - offset < Message.HEADER_SIZE:
+            raise RuntimeError('Truncated message header at offset %d' % offset)
+        size = _FRAME_HEADER.unpack_from(buffer, offset)[2]
+        if size < Message.HEADER_SIZE or size % 8 != 0:
+            raise RuntimeError('Invalid message size %d at offset %d' % (size, offset))
+        if size > end - offset:
+            raise RuntimeError('Truncated message at offset %d' % offset)
+        frames.append((offset, size))
+        offset += size
+    return frames
+
+def split_chunks(frames, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Group consecutive frames into (start, end) byte ranges of about chunk_size bytes"""
+    chunks = []
+    start = None
+    for (offset, size) in frames:
+        if start is None:
+            start = offset
+        if offset + size - start >= chunk_size:
+            chunks.append((start, offset + size))
+            start = None
+    if start is not None:
+        chunks.append((start, frames[-1][0] + frames[-1][1]))
+    return chunks
+
+def _decode_messages(view, start, end):
+    messages = []
+    for (offset, size) in scan_frames(view, start, end):
+        with view[offset:offset + size] as frame:
+            messages.append(Message.from_binary(frame))
+    return messages
+
+def _collect_stats(view, start, end):
+    """Return {message code: [count, bytes, fields]} for messages in range"""
+    stats = {}
+    for (offset, size) in scan_frames(view, start, end):
+        with view[offset:offset + size] as frame:
+            message = Message.from_binary(frame)
+        entry = stats.get(message.message_code)
+        if entry is None:
+            entry = stats[message.message_code] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += size
+        if not message.flags & _NO_FIELDS:
+            entry[2] += len(message.fields)
+    return stats
+
+_TASKS = {
+    'messages': _decode_messages,
+    'stats': _collect_stats,
+}
+
+# file mapping of worker process, opened once by pool initializer
+_worker_view = None
+
+def _init_worker(path):
+    global _worker_view
+    with open(path, 'rb') as f:
+        _worker_view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def _run_task(task, start, end):
+    return _TASKS[task](_worker_view, start, end)
+
+def _map_file(path, task, workers, chunk_size):
+    """Yield results of task for consecutive chunks of file, in file order"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            view = memoryview(mapping)
+            try:
+                chunks = split_chunks(scan_frames(view), chunk_size)
+                if workers == 1:
+                    for (start, end) in chunks:
+                        yield _TASKS[task](view, start, end)
+                    return
+            finally:
+                view.release()
+    # number of chunks in flight is bounded, so results are not piling up in memory
+    # when consumer is slower than workers
+    executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path,))
+    try:
+        pending = collections.deque()
+        for (start, end) in chunks:
+            pending.append(executor.submit(_run_task, task, start, end))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def decode_file(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield decoded messages from capture file in file order (workers=1 decodes in current process)"""
+    for messages in _map_file(path, 'messages', workers, chunk_size):
+        yield from messages
+
+def file_stats(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return {message code: {'count', 'bytes', 'fields'}} aggregated over capture file"""
+    total = {}
+    for stats in _map_file(path, 'stats', workers, chunk_size):
+        for (code, (count, size, fields)) in stats.items():
+            entry = total.setdefault(code, {'count': 0, 'bytes': 0, 'fields': 0})
+            entry['count'] += count
+            entry['bytes'] += size
+            entry['fields'] += fields
+    return total
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be positive integer: %r' % value)
+    return number
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m netxms.decode', description='Decode NXCP capture file')
+    parser.add_argument('file')
+    parser.add_argument('--workers', type=_positive_int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type=_positive_int, default=DEFAULT_CHUNK_SIZE, help='bytes per work item')
+    parser.add_argument('--dump', action='store_true', help='print every message instead of statistics')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.dump:
+            for message in decode_file(args.file, args.workers, args.chunk_size):
+                print(message)
+        else:
+            stats = file_stats(args.file, args.workers, args.chunk_size)
+            print('%10s %12s %14s %12s' % ('code', 'messages', 'bytes', 'fields'))
+            for code in sorted(stats):
+                entry = stats[code]
+                print('%#10x %12d %14d %12d' % (code, entry['count'], entry['bytes'], entry['fields']))
+    except (OSError, RuntimeError) as e:
+        print('Error: %s' % e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Self-contained NXCP load testing on localhost. MockServer answers requests with canned
+or generated replies and can push notification floods to connected clients; run_load()
+drives concurrent Sessions against it and reports requests/s, latency and bytes/s.
+
+Command line: python -m netxms.loadtest [--sessions N] [--requests N] [--concurrency N]
+    [--fields N] [--reply-fields N] [--flood N] [--host HOST --port PORT | --serve]
+"""
+import argparse
+import asyncio
+import math
+import sys
+import time
+
+from .message import Message
+from .reader import MessageReader
+from .session import Session
+
+CMD_KEEPALIVE = 0x0003
+CMD_REQUEST_COMPLETED = 0x001C
+CMD_NOTIFY = 0x004E
+
+FLOOD_BATCH = 256
+
+def fill_message(message, field_count, base_id=1000):
+    """Add field_count fields of mixed types to message, return message"""
+    for i in range(field_count):
+        field_id = base_id + i
+        if i % 4 == 0:
+            message.set(field_id, i)
+        elif i % 4 == 1:
+            message.set_int64(field_id, i * 1000000007)
+        elif i % 4 == 2:
+            message.set(field_id, i / 3.0)
+        else:
+            message.set(field_id, 'Object name %d' % i)
+    return message
+
+def echo(request):
+    """Reply handler returning request fields in CMD_REQUEST_COMPLETED message"""
+    reply = Message(CMD_REQUEST_COMPLETED)
+    reply.fields = request.fields
+    return reply
+
+class _ServerProtocol(asyncio.Protocol):
+    def __init__(self, server):
+        self._server = server
+        self._reader = MessageReader(limits=server.limits)
+        self._transport = None
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server._clients.add(self)
+
+    def connection_lost(self, exc):
+        self._transport = None
+        self._can_write.set()
+        self._server._clients.discard(self)
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    def data_received(self, data):
+        server = self._server
+        server.bytes_received += len(data)
+        replies = []
+        try:
+            for request in self._reader.feed(data):
+                server.requests += 1
+                reply = server._reply(request)
+                if reply is not None:
+                    replies.append(reply)
+        except RuntimeError:
+            self._transport.abort()
+            return
+        if replies:
+            self.write(replies)
+
+    def write(self, chunks):
+        if self._transport is not None:
+            self._transport.writelines(chunks)
+            self._server.bytes_sent += sum(len(data) for data in chunks)
+
+    async def drain(self):
+        await self._can_write.wait()
+
+class MockServer():
+    """
+    NXCP server stand-in. Replies are configured per request code: Message is sent as
+    canned reply (with message id of request; its serialization cache is enabled),
+    callable gets request and returns reply Message or None to send nothing, and integer
+    is message code of canned reply without fields. Requests with code without handler are answered with default_reply; None
+    leaves them unanswered.
+    """
+
+    def __init__(self, handlers=None, default_reply=CMD_REQUEST_COMPLETED, host='127.0.0.1', port=0, limits=None):
+        self.handlers = {}
+        for (code, handler) in (handlers or {}).items():
+            self.set_handler(code, handler)
+        self.default_reply = self._canned(default_reply)
+        self.host = host
+        self.port = port
+        self.limits = limits
+        self.requests = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._clients = set()
+        self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @staticmethod
+    def _canned(handler):
+        if isinstance(handler, int):
+            handler = Message(handler)
+        if isinstance(handler, Message):
+            handler.cache = True
+        return handler
+
+    def set_handler(self, message_code, handler):
+        self.handlers[message_code] = self._canned(handler)
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _ServerProtocol(self), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for client in list(self._clients):
+                client._transport.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _reply(self, request):
+        """Serialized reply to request or None"""
+        handler = self.handlers.get(request.message_code, self.default_reply)
+        if handler is None:
+            return None
+        if isinstance(handler, Message):
+            # canned reply keeps its serialized form cached, only header is patched
+            reply = handler
+        else:
+            reply = handler(request)
+            if reply is None:
+                return None
+        reply.message_id = request.message_id
+        return reply.serialize()
+
+    async def wait_for_clients(self, count, timeout=None):
+        """Wait until at least count clients are connected"""
+        async def wait():
+            while len(self._clients) < count:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(wait(), timeout)
+
+    async def flood(self, notification, count, rate=None):
+        """
+        Push count copies of notification to every currently connected client, at most
+        rate messages per second per client if rate is set, respecting transport flow
+        control. Return total number of messages written.
+        """
+        data = notification.serialize()
+        clients = list(self._clients)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sent = 0
+        while sent < count:
+            n = min(FLOOD_BATCH if rate is None else max(1, int(rate / 100)), count - sent)
+            chunks = [data] * n
+            for client in clients:
+                client.write(chunks)
+            sent += n
+            for client in clients:
+                await client.drain()
+            delay = 0 if rate is None else sent / rate - (loop.time() - started)
+            await asyncio.sleep(max(delay, 0))
+        return sent * len(clients)
+
+class LoadResult():
+    """Outcome of run_load(); latencies are in seconds, sorted ascending"""
+
+    def __init__(self, sessions, elapsed, latencies, errors, notifications, bytes_sent, bytes_received):
+        self.sessions = sessions
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.notifications = notifications
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return (self.bytes_sent + self.bytes_received) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentile(self, p):
+        """Latency at percentile p (nearest rank), None if no request completed"""
+        if not self.latencies:
+            return None
+        rank = max(1, int(math.ceil(p / 100.0 * len(self.latencies))))
+        return self.latencies[min(rank, len(self.latencies)) - 1]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    def report(self):
+        lines = [
+            'sessions:      %d' % self.sessions,
+            'requests:      %d (%d errors)' % (self.requests, self.errors),
+            'elapsed:       %.3f s' % self.elapsed,
+            'requests/s:    %.1f' % self.requests_per_second,
+        ]
+        if self.latencies:
+            lines.append('latency p50:   %.3f ms' % (self.p50 * 1000))
+            lines.append('latency p99:   %.3f ms' % (self.p99 * 1000))
+        lines.append('bytes/s:       %.1f (%d sent, %d received)' % (self.bytes_per_second, self.bytes_sent, self.bytes_received))
+        if self.notifications:
+            lines.append('notifications: %d' % self.notifications)
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return 'LoadResult{requests=%d,errors=%d,elapsed=%.3f}' % (self.requests, self.errors, self.elapsed)
+
+def _keepalive():
+    return Message(CMD_KEEPALIVE)
+
+async def run_load(host, port, sessions=10, requests=1000, concurrency=1, request_factory=_keepalive,
+        timeout=Session.DEFAULT_TIMEOUT, compression_threshold=None, on_connected=None):
+    """
+    Open sessions connections and send requests requests over each one, keeping up to
+    concurrency requests in flight per session. request_factory returns new request
+    Message for every call; on_connected is called once all sessions are connected,
+    right before first request. Notifications received meanwhile are counted and
+    dropped. Return LoadResult.
+    """
+    connections = await asyncio.gather(*[
+        Session.connect(host, port, timeout=timeout, compression_threshold=compression_threshold)
+        for _ in range(sessions)])
+    latencies = []
+    errors = 0
+    notifications = 0
+
+    async def worker(session, count):
+        nonlocal errors
+        for _ in range(count):
+            request = request_factory()
+            started = time.perf_counter()
+            try:
+                await session.request(request)
+            except (asyncio.TimeoutError, ConnectionError):
+                errors += 1
+                if not session.connected:
+                    return
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    async def consume(session):
+        nonlocal notifications
+        while True:
+            await session.notifications.get()
+            notifications += 1
+
+    consumers = [asyncio.ensure_future(consume(session)) for session in connections]
+    try:
+        if on_connected is not None:
+            on_connected()
+        started = time.perf_counter()
+        workers = []
+        for session in connections:
+            for n in range(concurrency):
+                count = requests // concurrency + (1 if n < requests % concurrency else 0)
+                workers.append(worker(session, count))
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - started
+        # let notifications already received be counted
+        await asyncio.sleep(0)
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*[session.close() for session in connections], return_exceptions=True)
+    return LoadResult(sessions, elapsed, latencies, errors, notifications,
+        sum(session.bytes_sent for session in connections),
+        sum(session.bytes_received for session in connections))
+
+async def _run(args):
+    def request_factory():
+        return fill_message(Message(CMD_KEEPALIVE), args.fields)
+
+    server = None
+    if args.port is None or args.serve:
+        server = MockServer(default_reply=fill_message(Message(CMD_REQUEST_COMPLETED), args.reply_fields),
+            host=args.host, port=args.port or 0)
+        await server.start()
+    try:
+        if args.serve:
+            print('Listening on %s:%d' % (server.host, server.port), flush=True)
+            while True:
+                await asyncio.sleep(3600)
+        flood = []
+        def start_flood():
+            if args.flood > 0 and server is not None:
+                notification = fill_message(Message(CMD_NOTIFY), args.reply_fields)
+                flood.append(asyncio.ensure_future(server.flood(notification, args.flood)))
+        result = await run_load(args.host, args.port or server.port, args.sessions, args.requests,
+            args.concurrency, request_factory, args.timeout, on_connected=start_flood)
+        await asyncio.gather(*flood)
+    finally:
+        if server is not None:
+            await server.close()
+    print(result.report())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m netxms.loadtest', description='NXCP load generator and mock server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='connect to running mock server instead of starting one')
+    parser.add_argument('--serve', action='store_true', help='only run mock server until interrupted')
+    parser.add_argument('--sessions', type=int, default=10, help='number of concurrent sessions')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per session')
+    parser.add_argument('--concurrency', type=int, default=1, help='requests in flight per session')
+    parser.add_argument('--fields', type=int, default=0, help='fields in every request')
+    parser.add_argument('--reply-fields', type=int, default=0, help='fields in every reply and notification')
+    parser.add_argument('--flood', type=int, default=0, help='notifications pushed to every session during the run')
+    parser.add_argument('--timeout', type=float, default=Session.DEFAULT_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, RuntimeError, asyncio.TimeoutError) as e:
+        print('Error: %s' % e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
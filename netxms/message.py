@@ -1,6 +1,13 @@
+from collections import OrderedDict
 from enum import IntFlag
+import array
+import asyncio
+import functools
 import ipaddress
 import struct
+import sys
+import threading
+import zlib
 
 class FieldType(IntFlag):
     INTEGER = 0
@@ -12,132 +19,440 @@ class FieldType(IntFlag):
     INETADDR = 6
     DETECT = 99
 
+# plain int aliases, enum attribute lookup is slow on hot path
+_INTEGER = int(FieldType.INTEGER)
+_STRING = int(FieldType.STRING)
+_INT64 = int(FieldType.INT64)
+_INT16 = int(FieldType.INT16)
+_BINARY = int(FieldType.BINARY)
+_FLOAT = int(FieldType.FLOAT)
+_INETADDR = int(FieldType.INETADDR)
+_DETECT = int(FieldType.DETECT)
+
+_HEADER = struct.Struct('!HHIII')
+_INT16_FIELD = struct.Struct('!IBBH')
+_INTEGER_FIELD = struct.Struct('!IBBHI4x')
+_INT64_FIELD = struct.Struct('!IBBHQ')
+_FLOAT_FIELD = struct.Struct('!IBBHd')
+_INETADDR_FIELD = struct.Struct('!IBBH16sBB6x')
+_VARIABLE_FIELD = struct.Struct('!IBBHI')
+_FIELD_HEADER = struct.Struct('!IB')
+_LENGTH = struct.Struct('!I')
+_CODE = struct.Struct('!H')
+_FIXED_FIELD_SIZE = {
+    _INTEGER: 16,
+    _INT64: 16,
+    _INT16: 8,
+    _FLOAT: 16,
+    _INETADDR: 32,
+}
+_VARIABLE_TYPES = {_STRING, _BINARY}
+_PADDING = tuple(b'\0' * n for n in range(8))
+
+# field type -> (field size, array typecode, value item position and step within run in typecode items)
+_RANGE_LAYOUT = {
+    _INT16: (8, 'H', 3, 4),
+    _INTEGER: (16, 'I', 2, 4),
+    _INT64: (16, 'Q', 1, 2),
+    _FLOAT: (16, 'd', 1, 2),
+}
+_BYTESWAP = sys.byteorder == 'little'
+
+class DecodeError(RuntimeError):
+    """Base class for errors in received messages"""
+
+class TruncatedMessage(DecodeError):
+    pass
+
+class InvalidMessage(DecodeError):
+    pass
+
+class MessageTooLarge(DecodeError):
+    pass
+
+class TooManyFields(DecodeError):
+    pass
+
+class FieldTooLarge(DecodeError):
+    pass
+
+class DecodedSizeExceeded(DecodeError):
+    pass
+
+class DecodeLimits():
+    """
+    Limits for decoding messages from untrusted peers, None means no limit. Sizes are in
+    bytes: max_message_size applies to received and decompressed message, max_field_size
+    to single string or binary value, max_decoded_size to all string and binary values
+    (and binary message data) together. All limits are checked before memory is allocated.
+    """
+
+    def __init__(self, max_message_size=None, max_fields=None, max_field_size=None, max_decoded_size=None):
+        self.max_message_size = max_message_size
+        self.max_fields = max_fields
+        self.max_field_size = max_field_size
+        self.max_decoded_size = max_decoded_size
+
+    def check_message_size(self, size):
+        if self.max_message_size is not None and size > self.max_message_size:
+            raise MessageTooLarge('Message size %d exceeds limit of %d bytes' % (size, self.max_message_size))
+
+    def check_field_count(self, count):
+        if self.max_fields is not None and count > self.max_fields:
+            raise TooManyFields('Message has %d fields, limit is %d' % (count, self.max_fields))
+
+    def check_field_size(self, field_id, size):
+        if self.max_field_size is not None and size > self.max_field_size:
+            raise FieldTooLarge('Field %d size %d exceeds limit of %d bytes' % (field_id, size, self.max_field_size))
+
+    def check_decoded_size(self, size):
+        if self.max_decoded_size is not None and size > self.max_decoded_size:
+            raise DecodedSizeExceeded('Decoded data size %d exceeds limit of %d bytes' % (size, self.max_decoded_size))
+
+def _encode_range(base_id, values, field_type):
+    """Encode values as run of consecutive fields base_id, base_id + 1, ... using strided array copies"""
+    (size, typecode, start, step) = _RANGE_LAYOUT[field_type]
+    values = array.array(typecode, values)
+    count = len(values)
+    ids = array.array('I', range(base_id, base_id + count))
+    if _BYTESWAP:
+        values.byteswap()
+        ids.byteswap()
+    block = bytearray(size * count)
+    with memoryview(block) as view:
+        with view.cast('I') as words:
+            words[0::size // 4] = ids
+        with view.cast(typecode) as items:
+            items[start::step] = values
+    block[4::size] = bytes((field_type,)) * count
+    return (bytes(block), count)
+
+def _decode_range(buffer, offset, base_id, count, field_type):
+    """Decode run of consecutive fields at offset into array, return None if buffer holds different layout"""
+    (size, typecode, start, step) = _RANGE_LAYOUT[field_type]
+    end = offset + size * count
+    if offset < 0 or end > len(buffer):
+        return None
+    with memoryview(buffer)[offset:end] as view:
+        if view[4::size].tobytes() != bytes((field_type,)) * count:
+            return None
+        with view.cast('I') as words:
+            ids = array.array('I', words[0::size // 4].tobytes())
+        with view.cast(typecode) as items:
+            values = array.array(typecode, items[start::step].tobytes())
+    if _BYTESWAP:
+        ids.byteswap()
+        values.byteswap()
+    if ids != array.array('I', range(base_id, base_id + count)):
+        return None
+    return values
+
+class StringCache():
+    """
+    Bounded LRU cache of decoded string field values, keyed by encoded (UTF-16BE) bytes.
+    Repeated values are decoded once and shared as interned str objects. Encoded values
+    longer than max_length bytes are decoded without caching.
+    """
+
+    def __init__(self, maxsize=4096, max_length=256):
+        self.maxsize = maxsize
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def decode(self, data):
+        if len(data) > self.max_length:
+            return str(data, 'utf-16be')
+        key = bytes(data)
+        cache = self._cache
+        # hit path relies on atomicity of OrderedDict operations and takes no lock,
+        # so hit counter is approximate when cache is shared by threads
+        value = cache.get(key)
+        if value is not None:
+            self.hits += 1
+            try:
+                cache.move_to_end(key)
+            except KeyError:
+                pass
+            return value
+        value = sys.intern(str(key, 'utf-16be'))
+        with self._lock:
+            self.misses += 1
+            cache[key] = value
+            while len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+_string_cache = None
+_new_field = object.__new__
+
+def set_string_cache(cache):
+    """Use StringCache for decoding string fields (None to disable), return previously used cache"""
+    global _string_cache
+    previous = _string_cache
+    _string_cache = cache
+    return previous
+
+_UINT16 = struct.Struct('!H')
+_UINT32 = struct.Struct('!I')
+_UINT64 = struct.Struct('!Q')
+_DOUBLE = struct.Struct('!d')
+_INETADDR_VALUE = struct.Struct('!16sBB')
+_CUSTOM_FIELD = struct.Struct('!IBB2x')
+
+def _decode_int16(buffer, offset, field_id):
+    return (_UINT16.unpack_from(buffer, offset + 6)[0], offset + 8)
+
+def _decode_integer(buffer, offset, field_id):
+    return (_UINT32.unpack_from(buffer, offset + 8)[0], offset + 16)
+
+def _decode_int64(buffer, offset, field_id):
+    return (_UINT64.unpack_from(buffer, offset + 8)[0], offset + 16)
+
+def _decode_float(buffer, offset, field_id):
+    return (_DOUBLE.unpack_from(buffer, offset + 8)[0], offset + 16)
+
+def _decode_string(buffer, offset, field_id):
+    length = _LENGTH.unpack_from(buffer, offset + 8)[0]
+    start = offset + 12
+    if start + length > len(buffer):
+        raise TruncatedMessage('Field %d is truncated' % field_id)
+    try:
+        if _string_cache is None:
+            value = str(buffer[start:start + length], 'utf-16be')
+        else:
+            value = _string_cache.decode(buffer[start:start + length])
+    except UnicodeDecodeError as e:
+        raise InvalidMessage('Invalid string in field %d (%s)' % (field_id, e))
+    return (value, offset + ((12 + length + 7) & ~7))
+
+def _decode_binary(buffer, offset, field_id):
+    length = _LENGTH.unpack_from(buffer, offset + 8)[0]
+    start = offset + 12
+    if start + length > len(buffer):
+        raise TruncatedMessage('Field %d is truncated' % field_id)
+    return (bytes(buffer[start:start + length]), offset + ((12 + length + 7) & ~7))
+
+def _decode_inetaddr(buffer, offset, field_id):
+    (address, family, mask) = _INETADDR_VALUE.unpack_from(buffer, offset + 8)
+    # address may have host bits set (interface address with network mask)
+    try:
+        if family == 0:
+            value = ipaddress.IPv4Network((address[:4], mask), strict=False)
+        elif family == 1:
+            value = ipaddress.IPv6Network((address, mask), strict=False)
+        else:
+            # UNSPEC
+            value = None
+    except ValueError as e:
+        raise InvalidMessage('Invalid address in field %d (%s)' % (field_id, e))
+    return (value, offset + 32)
+
+def _pack_int16(buffer, offset, field_id, field_type, value):
+    _INT16_FIELD.pack_into(buffer, offset, field_id, field_type, 0, value)
+    return offset + 8
+
+def _pack_integer(buffer, offset, field_id, field_type, value):
+    _INTEGER_FIELD.pack_into(buffer, offset, field_id, field_type, 0, 0, value)
+    return offset + 16
+
+def _pack_int64(buffer, offset, field_id, field_type, value):
+    _INT64_FIELD.pack_into(buffer, offset, field_id, field_type, 0, 0, value)
+    return offset + 16
+
+def _pack_float(buffer, offset, field_id, field_type, value):
+    _FLOAT_FIELD.pack_into(buffer, offset, field_id, field_type, 0, 0, value)
+    return offset + 16
+
+def _pack_inetaddr(buffer, offset, field_id, field_type, value):
+    value_type = type(value)
+    if value_type is ipaddress.IPv4Network:
+        (address, family, prefixlen) = (value.network_address.packed, 0, value.prefixlen)
+    elif value_type is ipaddress.IPv6Network:
+        (address, family, prefixlen) = (value.network_address.packed, 1, value.prefixlen)
+    else:
+        (address, family, prefixlen) = (b'', 2, 0)
+    _INETADDR_FIELD.pack_into(buffer, offset, field_id, field_type, 0, 0, address, family, prefixlen)
+    return offset + 32
+
+def _pack_variable(buffer, offset, field_id, field_type, data):
+    length = len(data)
+    _VARIABLE_FIELD.pack_into(buffer, offset, field_id, field_type, 0, 0, length)
+    offset += 12
+    buffer[offset:offset + length] = data
+    offset += length
+    padding = (4 - length) & 7 # field header is 12 bytes
+    if padding != 0:
+        buffer[offset:offset + padding] = _PADDING[padding]
+        offset += padding
+    return offset
+
+def _encode_string(value):
+    return value.encode('utf-16be')
+
+def _encode_binary(value):
+    return value
+
+# field type -> (value stored in MessageField.field_type, decoder returning (value, next field offset))
+_DECODERS = {
+    _INTEGER: (FieldType.INTEGER, _decode_integer),
+    _STRING: (FieldType.STRING, _decode_string),
+    _INT64: (FieldType.INT64, _decode_int64),
+    _INT16: (FieldType.INT16, _decode_int16),
+    _BINARY: (FieldType.BINARY, _decode_binary),
+    _FLOAT: (FieldType.FLOAT, _decode_float),
+    _INETADDR: (FieldType.INETADDR, _decode_inetaddr),
+}
+# field type -> (fixed field size or None, variable data encoder, fixed field packer returning next offset)
+_ENCODERS = {
+    _INTEGER: (16, None, _pack_integer),
+    _STRING: (None, _encode_string, None),
+    _INT64: (16, None, _pack_int64),
+    _INT16: (8, None, _pack_int16),
+    _BINARY: (None, _encode_binary, None),
+    _FLOAT: (16, None, _pack_float),
+    _INETADDR: (32, None, _pack_inetaddr),
+}
+# Python type -> field type for FieldType.DETECT; other types are sent as strings
+_DETECTED_TYPES = {
+    int: FieldType.INTEGER,
+    float: FieldType.FLOAT,
+    bytes: FieldType.BINARY,
+    ipaddress.IPv4Address: FieldType.INETADDR,
+    ipaddress.IPv6Address: FieldType.INETADDR,
+    ipaddress.IPv4Network: FieldType.INETADDR,
+    ipaddress.IPv6Network: FieldType.INETADDR,
+}
+
+_BUILTIN_TYPES = frozenset(_DECODERS)
+
+def register_field_type(field_type, encode, decode, python_type=None, size=None):
+    """
+    Register custom field type (code not used by FieldType). Variable-length fields
+    (size None) are framed like binary fields: encode(value) returns payload bytes and
+    decode(payload) returns value. Fixed-length fields take size bytes (multiple of 8)
+    including 8-byte field header; encode must return exactly size - 8 bytes. Values of
+    python_type are encoded as this type when field type is detected automatically.
+    """
+    field_type = int(field_type)
+    if field_type in _DECODERS or field_type == _DETECT or not 0 <= field_type <= 255:
+        raise RuntimeError('Field type %d cannot be registered' % field_type)
+    if size is not None and (size < 8 or size % 8 != 0):
+        raise RuntimeError('Invalid field size %d' % size)
+
+    if size is None:
+        def decoder(buffer, offset, field_id):
+            (data, next_offset) = _decode_binary(buffer, offset, field_id)
+            return (decode(data), next_offset)
+        _VARIABLE_TYPES.add(field_type)
+        _ENCODERS[field_type] = (None, encode, None)
+    else:
+        def decoder(buffer, offset, field_id):
+            if offset + size > len(buffer):
+                raise TruncatedMessage('Field %d is truncated' % field_id)
+            return (decode(bytes(buffer[offset + 8:offset + size])), offset + size)
+
+        def packer(buffer, offset, field_id, field_type, value):
+            data = encode(value)
+            if len(data) != size - 8:
+                raise RuntimeError('Encoded value of field %d has %d bytes instead of %d' % (field_id, len(data), size - 8))
+            _CUSTOM_FIELD.pack_into(buffer, offset, field_id, field_type, 0)
+            buffer[offset + 8:offset + size] = data
+            return offset + size
+        _FIXED_FIELD_SIZE[field_type] = size
+        _ENCODERS[field_type] = (size, None, packer)
+    _DECODERS[field_type] = (field_type, decoder)
+    if python_type is not None:
+        _DETECTED_TYPES[python_type] = field_type
+
+def unregister_field_type(field_type):
+    """Remove custom field type added by register_field_type()"""
+    field_type = int(field_type)
+    if field_type in _BUILTIN_TYPES or field_type not in _DECODERS:
+        raise RuntimeError('Field type %d is not registered custom type' % field_type)
+    del _DECODERS[field_type]
+    del _ENCODERS[field_type]
+    _FIXED_FIELD_SIZE.pop(field_type, None)
+    _VARIABLE_TYPES.discard(field_type)
+    for python_type in [t for (t, registered) in _DETECTED_TYPES.items() if registered == field_type]:
+        del _DETECTED_TYPES[python_type]
+
 class MessageField():
-    value = None
+    __slots__ = ('field_id', 'field_type', 'value')
 
     def __init__(self, field_id, value, field_type=FieldType.DETECT):
         self.field_id = field_id
         self.value = value
-        value_type = type(value)
-        if field_type == FieldType.DETECT:
-            if value_type is int:
-                self.field_type = FieldType.INTEGER
-            elif value_type is float:
-                self.field_type = FieldType.FLOAT
-            elif value_type is bytes:
-                self.field_type = FieldType.BINARY
-            elif value_type in (ipaddress.IPv4Address, ipaddress.IPv6Address, ipaddress.IPv4Network, ipaddress.IPv6Network):
-                self.field_type = FieldType.INETADDR
-            else:
-                self.field_type = FieldType.STRING
-        else:
-            self.field_type = field_type
-
-        if self.field_type == FieldType.INETADDR:
+        if field_type == _DETECT:
+            field_type = _DETECTED_TYPES.get(type(value), FieldType.STRING)
+        if field_type == _INETADDR:
+            value_type = type(value)
             if value_type is ipaddress.IPv4Address:
                 self.value = ipaddress.IPv4Network(value)
-            if value_type is ipaddress.IPv6Address:
+            elif value_type is ipaddress.IPv6Address:
                 self.value = ipaddress.IPv6Network(value)
-
-        if self.field_type not in FieldType:
+        elif field_type not in _ENCODERS:
             raise RuntimeError('Invalid field type')
-    
+        self.field_type = field_type
+
     @classmethod
     def from_binary(cls, binary_field):
-        (field_id, field_type) = struct.unpack('!IB', binary_field[:5])
-        field_type = FieldType(field_type)
-        offset = 6 # 5 + 1 byte padding
-        if field_type == FieldType.INT16:
-            value = struct.unpack_from('!H', binary_field, offset)[0]
-            offset += 2
-        else:
-            offset += 2 # skip padding
-            if field_type == FieldType.INTEGER:
-                value = struct.unpack_from('!I', binary_field, offset)[0]
-                offset += 4
-            elif field_type == FieldType.INT64:
-                value = struct.unpack_from('!Q', binary_field, offset)[0]
-                offset += 8
-            elif field_type == FieldType.FLOAT:
-                value = struct.unpack_from('!d', binary_field, offset)[0]
-                offset += 8
-            elif field_type == FieldType.STRING:
-                field_data_len = struct.unpack_from('!I', binary_field, offset)[0]
-                offset += 4
-                value = (binary_field[offset:offset + field_data_len]).decode('utf-16be')
-                offset += field_data_len
-            elif field_type == FieldType.FLOAT:
-                raise RuntimeError('Not implemented')
-            elif field_type == FieldType.INETADDR:
-                address_data = binary_field[offset:offset + 16]
-                offset += 16
-                (family, mask) = struct.unpack_from('!BB', binary_field, offset)
-                if family == 0:
-                    value = ipaddress.IPv4Network(address_data[:4], mask)
-                elif family == 1:
-                    value = ipaddress.IPv6Network(address_data, mask)
-                    pass
-                else:
-                    # UNSPEC
-                    value = None
-                offset += 8 # 2 bytes data + padding
-            elif field_type == FieldType.BINARY:
-                field_data_len = struct.unpack_from('!I', binary_field, offset)[0]
-                offset += 4
-                value = binary_field[offset:offset + field_data_len]
-                offset += field_data_len
-            else:
-                raise RuntimeError('Unknown field type (%d)' % (field_type))
-        f = cls(field_id, value, field_type)
-        padding = offset % 8
-        if padding != 0:
-            offset += 8 - padding
-        return (f, offset)
+        return cls.unpack_from(binary_field, 0)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset):
+        """Decode field starting at absolute offset in buffer, return (field, next_offset)"""
+        (field_id, field_type) = _FIELD_HEADER.unpack_from(buffer, offset)
+        codec = _DECODERS.get(field_type)
+        if codec is None:
+            raise InvalidMessage('Unknown field type (%d)' % (field_type))
+        (value, offset) = codec[1](buffer, offset, field_id)
+        if cls is not MessageField:
+            return (cls(field_id, value, codec[0]), offset)
+        # decoded value needs no type detection or conversion done by __init__
+        field = _new_field(MessageField)
+        field.field_id = field_id
+        field.field_type = codec[0]
+        field.value = value
+        return (field, offset)
+
+    def prepare(self):
+        """Return (variable_data, padded_size) for two-phase encoding"""
+        codec = _ENCODERS.get(self.field_type)
+        if codec is None:
+            raise RuntimeError("Unknown field type (%d)" % self.field_type)
+        if codec[0] is not None:
+            return (None, codec[0])
+        data = codec[1](self.value)
+        return (data, (12 + len(data) + 7) & ~7)
+
+    def pack_into(self, buffer, offset, data=None):
+        """Encode field into buffer at offset, return offset past padded field"""
+        codec = _ENCODERS.get(self.field_type)
+        if codec is None:
+            raise RuntimeError("Unknown field type (%d)" % self.field_type)
+        if codec[0] is not None:
+            return codec[2](buffer, offset, self.field_id, self.field_type, self.value)
+        if data is None:
+            data = codec[1](self.value)
+        return _pack_variable(buffer, offset, self.field_id, self.field_type, data)
 
     def serialize(self):
-        output = struct.pack('!IBB',
-            self.field_id,
-            self.field_type,
-            0
-        )
-        if self.field_type == FieldType.INT16:
-            output += struct.pack('!H',
-            self.value
-        )
-        else:
-            output += struct.pack('!H', 0)
-            if self.field_type == FieldType.INTEGER:
-                output += struct.pack('!I', self.value)
-            elif self.field_type == FieldType.INT64:
-                output += struct.pack('!Q', self.value)
-            elif self.field_type == FieldType.FLOAT:
-                output += struct.pack('!d', self.value)
-            elif self.field_type == FieldType.STRING:
-                output += struct.pack('!I', len(self.value) * 2)
-                output += self.value.encode('utf-16be')
-            elif self.field_type == FieldType.BINARY:
-                output += struct.pack('!I', len(self.value))
-                output += self.value
-            elif self.field_type == FieldType.INETADDR:
-                value_type = type(self.value)
-                if value_type is ipaddress.IPv4Network:
-                    output += self.value.network_address.packed
-                    output += b'\000' * 12
-                    output += b'\000'
-                elif value_type is ipaddress.IPv6Network:
-                    output += self.value.network_address.packed
-                    output += b'\001'
-                else:
-                    output += b'\000' * 16
-                    output += b'\002'
-                output += struct.pack('!B', self.value.prefixlen)
-                output += b'\000' * 6
-            else:
-                raise RuntimeError("Unknown field type (%d)" % self.field_type)
-        padding = len(output) % 8
-        if padding != 0:
-            output += b'\0' * (8 - padding)
-        return output
+        (data, size) = self.prepare()
+        output = bytearray(size)
+        self.pack_into(output, 0, data)
+        return bytes(output)
 
     def __repr__(self):
         return 'MessageField{id=%d,type=%s,value=%s}' % (
@@ -157,27 +472,157 @@ class Flags(IntFlag):
     COMPRESSED = 0x0040
     STREAM = 0x0080
 
+_NO_FIELDS = int(Flags.BINARY | Flags.CONTROL)
+
 class Message():
+    """
+    NXCP message. With cache=True (for messages sent many times, e.g. broadcasts)
+    serialized form is kept until message content or flags change through Message
+    methods, and changing message_id or message_code only patches header of cached
+    form. Cached message does not see later in-place changes of field objects or
+    fields dict obtained earlier, nor of binary_data; call invalidate_cache() after them.
+    """
+    __slots__ = ('_message_code', '_message_id', '_flags', '_fields', '_index', '_view', '_ranges', '_control_data', '_binary_data', '_encoded', '_cache', '_pool')
     HEADER_SIZE = 16
+    COMPRESSION_LEVEL = 6
+    OFFLOAD_THRESHOLD = 256 * 1024
 
     def __init__(self, message_code, message_id = 0, **kwargs):
-        self.message_code = message_code
-        self.message_id = message_id
-        self.flags = 0
-        self.binary = False
-        self.control = False
-        self.fields = {}
+        self._fields = {}
+        self._index = None
+        self._pool = None
+        self.reset(message_code, message_id)
+        self._cache = kwargs.get('cache', False)
 
         if 'binary_message' in kwargs:
-            self.deserialize(kwargs.get('binary_message'))
+            self.deserialize(kwargs.get('binary_message'), kwargs.get('lazy', False), kwargs.get('limits'))
+
+    @classmethod
+    def from_binary(cls, binary_message, lazy=False, limits=None):
+        return Message(None, None, binary_message=binary_message, lazy=lazy, limits=limits)
 
     @classmethod
-    def from_binary(cls, binary_message):
-        return Message(None, None, binary_message=binary_message)
+    async def from_binary_async(cls, binary_message, lazy=False, limits=None, executor=None, threshold=None):
+        """
+        Decode message without blocking event loop: messages larger than threshold bytes
+        (OFFLOAD_THRESHOLD by default) are decoded in executor (loop default executor if not
+        given), smaller ones inline. Buffer must not be modified until decoding completes.
+        Lazily decoded messages reference buffer and cannot be returned from process pool.
+        """
+        with memoryview(binary_message) as view:
+            size = view.nbytes
+        if size <= (cls.OFFLOAD_THRESHOLD if threshold is None else threshold):
+            return cls.from_binary(binary_message, lazy, limits)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(cls.from_binary, binary_message, lazy, limits))
+
+    async def serialize_async(self, compression_threshold=None, executor=None, threshold=None):
+        """
+        Encode message without blocking event loop: messages with estimated size above
+        threshold bytes (OFFLOAD_THRESHOLD by default) are encoded in executor, smaller ones
+        inline. Cached serialized form is returned inline unless it has to be compressed.
+        Message must not be modified until encoding completes; process pool requires
+        message that is not lazily decoded.
+        """
+        encoded = self._encoded
+        inline = encoded is not None and not self._compressible(len(encoded), compression_threshold)
+        if inline or self._estimated_size() <= (self.OFFLOAD_THRESHOLD if threshold is None else threshold):
+            return self.serialize(compression_threshold)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.serialize, compression_threshold)
+
+    def _estimated_size(self):
+        """
+        Cheap estimate of serialized size: 16 bytes per field plus length of string
+        (UTF-16) and binary values; fields still pending in lazy index are counted by
+        size of source buffer
+        """
+        if self._flags & Flags.CONTROL:
+            return self.HEADER_SIZE
+        if self._flags & Flags.BINARY:
+            return self.HEADER_SIZE + len(self._binary_data)
+        size = self.HEADER_SIZE + len(self._fields) * 16
+        for field in self._fields.values():
+            value = field.value
+            if isinstance(value, str):
+                size += len(value) * 2
+            elif isinstance(value, (bytes, bytearray, memoryview)):
+                size += len(value)
+        if self._index is not None:
+            size += self._view.nbytes
+        if self._ranges is not None:
+            for (_, _, block) in self._ranges.values():
+                size += len(block)
+        return size
+
+    def reset(self, message_code=None, message_id=0):
+        """Clear message for reuse; fields dict object is kept and emptied"""
+        if self._index is not None:
+            self._release_view()
+        self._view = None
+        self._fields.clear()
+        self._ranges = None
+        self._encoded = None
+        self._cache = False
+        self._message_code = message_code
+        self._message_id = message_id
+        self._flags = 0
+        self._control_data = None
+        self._binary_data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self._pool is not None:
+            self._pool.release(self)
+
+    @property
+    def message_code(self):
+        return self._message_code
+
+    @message_code.setter
+    def message_code(self, new_value):
+        self._message_code = new_value
+        if self._encoded is not None:
+            _CODE.pack_into(self._encoded, 0, new_value)
+
+    @property
+    def message_id(self):
+        return self._message_id
+
+    @message_id.setter
+    def message_id(self, new_value):
+        self._message_id = new_value
+        if self._encoded is not None:
+            _LENGTH.pack_into(self._encoded, 8, new_value)
+
+    @property
+    def flags(self):
+        return self._flags
+
+    @flags.setter
+    def flags(self, new_value):
+        self._flags = new_value
+        self._encoded = None
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, new_value):
+        self._cache = bool(new_value)
+        if not self._cache:
+            self._encoded = None
+
+    def invalidate_cache(self):
+        """Drop cached serialized form"""
+        self._encoded = None
 
     @property
     def control(self):
-        return self.flags & Flags.CONTROL == Flags.CONTROL
+        return self._flags & Flags.CONTROL == Flags.CONTROL
 
     @control.setter
     def control(self, new_value):
@@ -188,7 +633,7 @@ class Message():
 
     @property
     def binary(self):
-        return self.flags & Flags.BINARY == Flags.BINARY
+        return self._flags & Flags.BINARY == Flags.BINARY
 
     @binary.setter
     def binary(self, new_value):
@@ -217,16 +662,31 @@ class Message():
 
     @property
     def fields(self):
+        self._encoded = None
+        if self._index is not None:
+            self._materialize()
+        if self._ranges is not None:
+            self._materialize_ranges()
         return self._fields
 
     @fields.setter
     def fields(self, new_value):
         if hasattr(self, '_Message_fields'):
             raise AttributeError("Attribute is read-only")
+        # fields still pending in lazy index or ranges must not reappear in new dict
+        if self._index is not None:
+            self._release_view()
+        self._ranges = None
         self._fields = new_value
+        self._encoded = None
 
     def set(self, code, value, field_type=FieldType.DETECT):
+        self._encoded = None
+        if self._ranges is not None:
+            self._materialize_ranges(code, code + 1)
         self._fields[code] = MessageField(code, value, field_type)
+        if self._index is not None:
+            self._index.pop(code, None)
     
     def set_int16(self, code, value):
         self.set(code, value, FieldType.INT16)
@@ -235,74 +695,389 @@ class Message():
         self.set(code, value, FieldType.INT64)
 
     def get(self, code):
+        self._encoded = None
         if code in self._fields:
             return self._fields[code]
+        if self._index is not None and code in self._index:
+            return self._decode_field(code)
+        if self._ranges is not None and self._materialize_ranges(code, code + 1):
+            return self._fields.get(code)
 
-    def serialize(self):
+    def set_range(self, base_id, values, field_type=FieldType.INTEGER):
+        """
+        Set fields base_id, base_id + 1, ... from sequence of numbers (list, array.array,
+        NumPy array). Values are encoded in bulk and kept encoded until accessed by get().
+        """
+        if field_type not in _RANGE_LAYOUT:
+            raise RuntimeError('Field type %s cannot be used in range' % FieldType(field_type))
+        (block, count) = _encode_range(base_id, values, field_type)
+        self._encoded = None
+        end = base_id + count
+        if self._ranges is not None:
+            self._materialize_ranges(base_id, end)
+        if self._fields and not self._fields.keys().isdisjoint(range(base_id, end)):
+            for code in range(base_id, end):
+                self._fields.pop(code, None)
+        if self._index is not None and not self._index.keys().isdisjoint(range(base_id, end)):
+            for code in range(base_id, end):
+                self._index.pop(code, None)
+            if not self._index:
+                self._release_view()
+        if count > 0:
+            if self._ranges is None:
+                self._ranges = {}
+            self._ranges[base_id] = (int(field_type), count, block)
+
+    def get_range(self, base_id, count, field_type=FieldType.INTEGER, as_numpy=False):
+        """
+        Get values of fields base_id .. base_id + count - 1 as array.array (or NumPy array).
+        Runs kept encoded (lazy decoding or set_range) are converted in bulk without creating
+        MessageField objects; otherwise values are collected field by field.
+        """
+        if field_type not in _RANGE_LAYOUT:
+            raise RuntimeError('Field type %s cannot be used in range' % FieldType(field_type))
+        values = self._decode_encoded_range(base_id, count, int(field_type))
+        if values is None:
+            values = array.array(_RANGE_LAYOUT[field_type][1])
+            for code in range(base_id, base_id + count):
+                field = self.get(code)
+                if field is None:
+                    raise RuntimeError('Field %d not found' % code)
+                values.append(field.value)
+        if as_numpy:
+            import numpy
+            return numpy.frombuffer(values, dtype=values.typecode)
+        return values
+
+    def _decode_encoded_range(self, base_id, count, field_type):
+        end = base_id + count
+        if count == 0:
+            return None
+        if self._fields and not self._fields.keys().isdisjoint(range(base_id, end)):
+            return None
+        if self._ranges is not None:
+            for (start, (range_type, range_count, block)) in self._ranges.items():
+                if range_type == field_type and start <= base_id and end <= start + range_count:
+                    return _decode_range(block, (base_id - start) * _RANGE_LAYOUT[field_type][0], base_id, count, field_type)
+        if self._index is not None and base_id in self._index:
+            return _decode_range(self._view, self._index[base_id], base_id, count, field_type)
+        return None
+
+    def _materialize_ranges(self, start=None, end=None):
+        """Decode ranges set by set_range() overlapping with [start, end) (all if not given), return True if any"""
+        found = False
+        for (base_id, (field_type, count, block)) in list(self._ranges.items()):
+            if start is not None and (base_id >= end or base_id + count <= start):
+                continue
+            offset = 0
+            for _ in range(count):
+                (field, offset) = MessageField.unpack_from(block, offset)
+                self._fields[field.field_id] = field
+            del self._ranges[base_id]
+            found = True
+        if not self._ranges:
+            self._ranges = None
+        return found
+
+    def _decode_field(self, code):
+        # entry is removed only after successful decoding, so failure is repeatable
+        field = MessageField.unpack_from(self._view, self._index[code])[0]
+        self._fields[code] = field
+        del self._index[code]
+        if not self._index:
+            self._release_view()
+        return field
+
+    def _materialize(self):
+        """Decode all fields still pending in lazy index"""
+        view = self._view
+        fields = self._fields
+        index = self._index
+        for code in list(index):
+            fields[code] = MessageField.unpack_from(view, index[code])[0]
+            del index[code]
+        self._release_view()
+
+    def _release_view(self):
+        self._index = None
+        self._view.release()
+        self._view = None
+
+    def _layout(self):
+        """
+        First encoding pass: returns (layout, exact message size, field count). Layout
+        items are (packer, field, value or encoded data); ranges set by set_range() are
+        (None, None, encoded block).
+        """
         if self.control:
-            return struct.pack("!HHIII",
-                self.message_code,
-                self.flags,
-                self.HEADER_SIZE,
-                self.message_id,
-                self._control_data
-            )
+            return (None, self.HEADER_SIZE, 0)
         elif self.binary:
-            padding = (8 - (len(self._binary_data) % 8)) & 7
-            packetSize = len(self._binary_data) + self.HEADER_SIZE + padding
-            output = struct.pack("!HHIII",
-                self.message_code,
-                self.flags,
-                packetSize,
-                self.message_id,
-                len(self._binary_data)
-            )
-            output += self._binary_data
-            output += struct.pack('B', 0) * padding
-            return output
+            return (None, self.HEADER_SIZE + ((len(self._binary_data) + 7) & ~7), 0)
+        if self._index is not None:
+            self._materialize()
+        layout = []
+        size = self.HEADER_SIZE
+        fields = self._fields
+        count = len(fields)
+        keys = sorted(fields) # order is important only for test
+        if self._ranges is not None:
+            for (base_id, (_, range_count, _)) in self._ranges.items():
+                count += range_count
+            keys = sorted(keys + list(self._ranges))
+        encoders = _ENCODERS
+        for key in keys:
+            field = fields.get(key)
+            if field is None:
+                block = self._ranges[key][2]
+                layout.append((None, None, block))
+                size += len(block)
+                continue
+            codec = encoders.get(field.field_type)
+            if codec is None:
+                raise RuntimeError("Unknown field type (%d)" % field.field_type)
+            if codec[0] is not None:
+                layout.append((codec[2], field, field.value))
+                size += codec[0]
+            else:
+                data = codec[1](field.value)
+                layout.append((_pack_variable, field, data))
+                size += (12 + len(data) + 7) & ~7
+        return (layout, size, count)
+
+    def _pack_into(self, buffer, offset, layout, size, count):
+        """Second encoding pass: writes message of known size into buffer"""
+        if self.control:
+            _HEADER.pack_into(buffer, offset, self.message_code, self.flags, size, self.message_id, self._control_data)
+        elif self.binary:
+            length = len(self._binary_data)
+            _HEADER.pack_into(buffer, offset, self.message_code, self.flags, size, self.message_id, length)
+            data_offset = offset + self.HEADER_SIZE
+            buffer[data_offset:data_offset + length] = self._binary_data
+            padding = size - self.HEADER_SIZE - length
+            if padding != 0:
+                buffer[data_offset + length:offset + size] = _PADDING[padding]
         else:
-            payload = b''
-            for key in sorted(self._fields): # order is important only for test
-                field = self._fields[key]
-                payload += field.serialize()
-
-            header = struct.pack("!HHIII",
-                self.message_code,
-                self.flags,
-                len(payload) + self.HEADER_SIZE,
-                self.message_id,
-                len(self.fields)
-            )
+            _HEADER.pack_into(buffer, offset, self.message_code, self.flags, size, self.message_id, count)
+            offset += self.HEADER_SIZE
+            for (packer, field, value) in layout:
+                if packer is None:
+                    buffer[offset:offset + len(value)] = value
+                    offset += len(value)
+                else:
+                    offset = packer(buffer, offset, field.field_id, field.field_type, value)
 
-            return header + payload
-        return None
-    
-    def deserialize(self, binary_message):
-        if len(binary_message) < self.HEADER_SIZE:
-            raise RuntimeError('Binary message is smaller than header size')
+    def serialized_size(self):
+        if self._encoded is not None:
+            return len(self._encoded)
+        return self._layout()[1]
+
+    def _compress(self, output):
+        """
+        Replace encoded message in output with compressed form (original size followed
+        by zlib stream) if that makes it smaller. Compressed data is written over the
+        uncompressed payload and output is truncated in place.
+        """
+        size = len(output)
+        with memoryview(output) as view, view[self.HEADER_SIZE:] as payload:
+            data = zlib.compress(payload, self.COMPRESSION_LEVEL)
+        length = len(data)
+        compressed_size = self.HEADER_SIZE + ((4 + length + 7) & ~7)
+        if compressed_size >= size:
+            return
+        flags = self.flags | Flags.COMPRESSED
+        _HEADER.pack_into(output, 0, self.message_code, flags, compressed_size, self.message_id, _LENGTH.unpack_from(output, 12)[0])
+        _LENGTH.pack_into(output, self.HEADER_SIZE, size)
+        offset = self.HEADER_SIZE + 4
+        output[offset:offset + length] = data
+        offset += length
+        output[offset:compressed_size] = _PADDING[compressed_size - offset]
+        del output[compressed_size:]
 
-        header = struct.unpack("!HHIII", binary_message[:self.HEADER_SIZE])
-        (self.message_code, self.flags, message_size, self.message_id, data) = header
+    def _compressible(self, size, compression_threshold):
+        return compression_threshold is not None and not self._flags & _NO_FIELDS and size - self.HEADER_SIZE > compression_threshold
 
-        if len(binary_message) != message_size:
-            raise RuntimeError('Binary message size does not match value in header')
+    def _encode(self, layout, size, count):
+        """Encode message into new buffer, keep it as serialized form if caching is enabled"""
+        encoded = bytearray(size)
+        self._pack_into(encoded, 0, layout, size, count)
+        if self._cache:
+            self._encoded = encoded
+        return encoded
+
+    def _compressed(self, encoded):
+        output = bytearray(encoded)
+        self._compress(output)
+        return output
+
+    def serialize(self, compression_threshold=None):
+        """Encode message; field messages with payload above compression_threshold bytes are compressed"""
+        encoded = self._encoded
+        if encoded is None:
+            encoded = self._encode(*self._layout())
+        if self._compressible(len(encoded), compression_threshold):
+            return bytes(self._compressed(encoded))
+        return bytes(encoded)
+
+    def serialize_into(self, buffer, offset=0, compression_threshold=None):
+        """Encode message into writable buffer at byte offset, return number of bytes written"""
+        if offset < 0:
+            raise RuntimeError('Invalid buffer offset (%d)' % offset)
+        encoded = self._encoded
+        if encoded is None:
+            (layout, size, count) = self._layout()
+            if self._compressible(size, compression_threshold):
+                encoded = self._encode(layout, size, count)
+        if encoded is not None:
+            if self._compressible(len(encoded), compression_threshold):
+                encoded = self._compressed(encoded)
+            size = len(encoded)
+        with memoryview(buffer) as view, view.cast('B') as output:
+            if output.nbytes - offset < size:
+                raise RuntimeError('Buffer too small for message (%d bytes required)' % size)
+            if encoded is None:
+                self._pack_into(output, offset, layout, size, count)
+            else:
+                output[offset:offset + size] = encoded
+        return size
+
+    def deserialize(self, binary_message, lazy=False, limits=None):
+        """
+        Decode binary message. In lazy mode only field headers are scanned and values are
+        decoded on first access. Read-only buffers (bytes, read-only mmap) are referenced
+        without copying; writable buffers are copied so caller can reuse or resize them.
+        Invalid messages and messages exceeding DecodeLimits raise DecodeError subclasses.
+        """
+        self._encoded = None
+        if self._index is not None:
+            self._materialize()
+        if self._ranges is not None:
+            self._materialize_ranges()
+        view = memoryview(binary_message)
+        if limits is not None:
+            try:
+                limits.check_message_size(view.nbytes)
+            except DecodeError:
+                view.release()
+                raise
+        if lazy and not view.readonly:
+            view.release()
+            view = memoryview(bytes(binary_message))
+        try:
+            self._deserialize(view, lazy, limits)
+        finally:
+            if self._view is not view:
+                view.release()
+
+    def _deserialize(self, view, lazy, limits):
+        message_size = len(view)
+        if message_size < self.HEADER_SIZE:
+            raise TruncatedMessage('Binary message is smaller than header size')
+
+        header = _HEADER.unpack_from(view, 0)
+        (self._message_code, self._flags, declared_size, self._message_id, data) = header
+
+        if message_size < declared_size:
+            raise TruncatedMessage('Message truncated (%d of %d bytes)' % (message_size, declared_size))
+        if message_size != declared_size:
+            raise InvalidMessage('Binary message size does not match value in header')
 
         if self.control:
             self._control_data = data
+        elif self.flags & Flags.COMPRESSED and self.binary:
+            raise InvalidMessage('Compressed binary messages are not supported')
         elif self.binary:
             binary_len = data
-            if binary_len > len(binary_message) - self.HEADER_SIZE:
-                raise RuntimeError('Invalid binary data len')
-            self._binary_data = binary_message[self.HEADER_SIZE:self.HEADER_SIZE+binary_len]
+            if binary_len > message_size - self.HEADER_SIZE:
+                raise TruncatedMessage('Invalid binary data len')
+            if limits is not None:
+                limits.check_decoded_size(binary_len)
+            self._binary_data = bytes(view[self.HEADER_SIZE:self.HEADER_SIZE+binary_len])
         else:
             number_of_fields = data
             offset = self.HEADER_SIZE
+            if self.flags & Flags.COMPRESSED:
+                view = self._decompress(view, limits)
+                offset = 0
+                message_size = len(view)
+            if limits is not None:
+                limits.check_field_count(number_of_fields)
+            # every field takes at least 8 bytes
+            if number_of_fields > (message_size - offset) // 8:
+                raise TruncatedMessage('Message truncated (%d fields declared in %d bytes)' % (number_of_fields, message_size - offset))
+            if lazy or limits is not None:
+                index = self._scan_fields(view, number_of_fields, offset, limits)
+            if lazy:
+                for code in index.keys() & self._fields.keys():
+                    del self._fields[code]
+                if index:
+                    self._index = index
+                    self._view = view
+                return
+            fields = self._fields
+            try:
+                if limits is not None:
+                    # message is already validated by scan
+                    for field_offset in index.values():
+                        field = MessageField.unpack_from(view, field_offset)[0]
+                        fields[field.field_id] = field
+                    return
+                for _ in range(0, number_of_fields):
+                    (field, offset) = MessageField.unpack_from(view, offset)
+                    if offset > message_size:
+                        raise TruncatedMessage('Message truncated')
+                    fields[field.field_id] = field
+            except struct.error:
+                raise TruncatedMessage('Message truncated')
+            except ValueError as e:
+                raise InvalidMessage('Invalid field value (%s)' % e)
+
+    def _decompress(self, view, limits):
+        """Return view of decompressed fields (without message header)"""
+        if len(view) < self.HEADER_SIZE + 4:
+            raise TruncatedMessage('Message truncated')
+        original_size = _LENGTH.unpack_from(view, self.HEADER_SIZE)[0]
+        if original_size < self.HEADER_SIZE:
+            raise InvalidMessage('Invalid uncompressed message size (%d)' % original_size)
+        if limits is not None:
+            limits.check_message_size(original_size)
+        expected = original_size - self.HEADER_SIZE
+        decompressor = zlib.decompressobj()
+        try:
+            with view[self.HEADER_SIZE + 4:] as data:
+                # output is bounded by size declared in message
+                payload = decompressor.decompress(data, expected + 1)
+        except zlib.error as e:
+            raise InvalidMessage('Cannot decompress message (%s)' % e)
+        if len(payload) != expected or not decompressor.eof:
+            raise InvalidMessage('Decompressed message size does not match value in header')
+        self.flags &= ~int(Flags.COMPRESSED)
+        return memoryview(payload)
+
+    def _scan_fields(self, view, number_of_fields, offset, limits=None):
+        """Build field id -> offset index from field headers only, checking limits if given"""
+        index = {}
+        message_size = len(view)
+        decoded_size = 0
+        try:
             for _ in range(0, number_of_fields):
-                (field, bytes_consumed) = MessageField.from_binary(binary_message[offset:])
-                offset += bytes_consumed
-                if offset > len(binary_message):
-                    raise RuntimeError('Message truncated')
-                self._fields[field.field_id] = field
+                (field_id, field_type) = _FIELD_HEADER.unpack_from(view, offset)
+                size = _FIXED_FIELD_SIZE.get(field_type)
+                if size is None:
+                    if field_type not in _VARIABLE_TYPES:
+                        raise InvalidMessage('Unknown field type (%d)' % (field_type))
+                    length = _LENGTH.unpack_from(view, offset + 8)[0]
+                    if limits is not None:
+                        limits.check_field_size(field_id, length)
+                        decoded_size += length
+                        limits.check_decoded_size(decoded_size)
+                    size = (12 + length + 7) & ~7
+                index[field_id] = offset
+                offset += size
+                if offset > message_size:
+                    raise TruncatedMessage('Message truncated')
+        except struct.error:
+            raise TruncatedMessage('Message truncated')
+        return index
 
     def __repr__(self):
         return "Message{code=%d, id=%d, flags=%d, binary=%s, control=%s, fields=%s}" % (
@@ -312,4 +1087,36 @@ class Message():
             'YES' if self.binary else 'NO',
             'YES' if self.control else 'NO',
             self.fields
-        )
\ No newline at end of file
+        )
+
+class MessagePool():
+    """
+    Bounded free list of Message objects for high-rate receiving. Messages taken from
+    pool are returned to it by release() or at the end of "with message:" block and
+    must not be used after that.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._free = []
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, message_code=None, message_id=0):
+        try:
+            message = self._free.pop()
+            message.message_code = message_code
+            message.message_id = message_id
+        except IndexError:
+            message = Message(message_code, message_id)
+        message._pool = self
+        return message
+
+    def release(self, message):
+        if message._pool is not self:
+            raise RuntimeError('Message is not taken from this pool or already released')
+        message._pool = None
+        message.reset()
+        if len(self._free) < self.maxsize:
+            self._free.append(message)
@@ -0,0 +1,132 @@
+"""
+Opt-in codec instrumentation. enable() wraps Message encoding and decoding methods
+with recording versions; disable() puts original methods back, so there is no
+overhead at all while instrumentation is off.
+"""
+import bisect
+import contextlib
+import struct
+import threading
+import time
+
+from .message import Flags, Message
+
+# upper bounds of latency histogram buckets, in seconds; last bucket is unbounded
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+_FLAGS = struct.Struct('!H')
+_FIELD_COUNT = struct.Struct('!I')
+_NO_FIELDS = Flags.BINARY | Flags.CONTROL
+
+class CodecMetrics():
+    """Per message code counters for encoded and decoded messages"""
+
+    def __init__(self, callback=None, buckets=LATENCY_BUCKETS):
+        self.callback = callback
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stats = {'encode': {}, 'decode': {}}
+
+    def record(self, direction, message_code, size, field_count, elapsed):
+        with self._lock:
+            stats = self._stats[direction].get(message_code)
+            if stats is None:
+                stats = {'count': 0, 'bytes': 0, 'fields': 0, 'seconds': 0.0, 'histogram': [0] * (len(self.buckets) + 1)}
+                self._stats[direction][message_code] = stats
+            stats['count'] += 1
+            stats['bytes'] += size
+            stats['fields'] += field_count
+            stats['seconds'] += elapsed
+            stats['histogram'][bisect.bisect_left(self.buckets, elapsed)] += 1
+        if self.callback is not None:
+            self.callback(direction, message_code, size, field_count, elapsed)
+
+    def snapshot(self):
+        """Return copy of counters as {'encode': {code: stats}, 'decode': {code: stats}}"""
+        with self._lock:
+            return {
+                direction: {code: dict(stats, histogram=list(stats['histogram'])) for (code, stats) in by_code.items()}
+                for (direction, by_code) in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats = {'encode': {}, 'decode': {}}
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_originals = {}
+
+def _field_count(buffer, offset):
+    if _FLAGS.unpack_from(buffer, offset + 2)[0] & _NO_FIELDS:
+        return 0
+    return _FIELD_COUNT.unpack_from(buffer, offset + 12)[0]
+
+def _record(direction, message_code, size, field_count, elapsed):
+    for sink in _sinks:
+        sink.record(direction, message_code, size, field_count, elapsed)
+
+def _serialize(self, *args, **kwargs):
+    start = time.perf_counter()
+    output = _originals['serialize'](self, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _record('encode', self.message_code, len(output), _field_count(output, 0), elapsed)
+    return output
+
+def _serialize_into(self, buffer, offset=0, *args, **kwargs):
+    start = time.perf_counter()
+    size = _originals['serialize_into'](self, buffer, offset, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    with memoryview(buffer) as view, view.cast('B') as output:
+        field_count = _field_count(output, offset)
+    _record('encode', self.message_code, size, field_count, elapsed)
+    return size
+
+def _deserialize(self, binary_message, *args, **kwargs):
+    start = time.perf_counter()
+    _originals['deserialize'](self, binary_message, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    with memoryview(binary_message) as view, view.cast('B') as data:
+        _record('decode', self.message_code, data.nbytes, _field_count(data, 0), elapsed)
+
+_WRAPPERS = {
+    'serialize': _serialize,
+    'serialize_into': _serialize_into,
+    'deserialize': _deserialize,
+}
+
+def enable(metrics=None):
+    """Start recording into metrics (new CodecMetrics if not given), return it"""
+    if metrics is None:
+        metrics = CodecMetrics()
+    with _sinks_lock:
+        if not _sinks:
+            for (name, wrapper) in _WRAPPERS.items():
+                _originals[name] = getattr(Message, name)
+                setattr(Message, name, wrapper)
+        _sinks.append(metrics)
+    return metrics
+
+def disable(metrics=None):
+    """Stop recording into metrics (into all if not given); original methods are restored when nothing records"""
+    with _sinks_lock:
+        if metrics is None:
+            del _sinks[:]
+        elif metrics in _sinks:
+            _sinks.remove(metrics)
+        if not _sinks and _originals:
+            for (name, original) in _originals.items():
+                setattr(Message, name, original)
+            _originals.clear()
+
+def enabled():
+    return bool(_sinks)
+
+@contextlib.contextmanager
+def profile(callback=None):
+    """Record codec activity of enclosed code path into separate CodecMetrics"""
+    metrics = enable(CodecMetrics(callback))
+    try:
+        yield metrics
+    finally:
+        disable(metrics)
@@ -0,0 +1,174 @@
+"""
+Append-only log of NXCP messages. Data file holds serialized messages exactly as
+they appear on the wire, one after another; sidecar index file (data file name +
+".idx") holds fixed-size (timestamp, message code, message id, offset, size) record
+for every message.
+"""
+import bisect
+import collections
+import mmap
+import os
+import struct
+import time
+
+from .message import Message
+
+INDEX_SUFFIX = '.idx'
+
+_INDEX_RECORD = struct.Struct('!dHIQI')
+_HEADER = struct.Struct('!HHII')
+
+LogRecord = collections.namedtuple('LogRecord', ('timestamp', 'message_code', 'message_id', 'offset', 'size'))
+
+def _valid_index_size(index, data_size):
+    """
+    Size of index file without trailing records left by interrupted writes: partially
+    written record or records pointing past end of data file.
+    """
+    size = index.seek(0, os.SEEK_END)
+    size -= size % _INDEX_RECORD.size
+    while size > 0:
+        index.seek(size - _INDEX_RECORD.size)
+        record = LogRecord(*_INDEX_RECORD.unpack(index.read(_INDEX_RECORD.size)))
+        if record.offset + record.size <= data_size:
+            break
+        size -= _INDEX_RECORD.size
+    return size
+
+class MessageLogWriter():
+    """Append messages to log, creating data and index files if they do not exist"""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = open(path, 'ab')
+        self._offset = self._data.tell()
+        self._index = open(path + INDEX_SUFFIX, 'a+b')
+        self._index.truncate(_valid_index_size(self._index, self._offset))
+        self._index.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, message, timestamp=None):
+        """Append Message or already serialized message, return its LogRecord"""
+        if isinstance(message, Message):
+            data = message.serialize()
+        else:
+            data = message
+        with memoryview(data) as view:
+            if len(view) < Message.HEADER_SIZE:
+                raise RuntimeError('Binary message is smaller than header size')
+            (code, _, size, message_id) = _HEADER.unpack_from(view, 0)
+            if size != len(view):
+                raise RuntimeError('Binary message size does not match value in header')
+            self._data.write(view)
+        record = LogRecord(time.time() if timestamp is None else timestamp, code, message_id, self._offset, size)
+        self._index.write(_INDEX_RECORD.pack(*record))
+        self._offset += size
+        return record
+
+    def flush(self):
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+class MessageLogReader():
+    """
+    Random access to message log through read-only mmap. Raw messages are returned as
+    memoryview slices of the mapping and lazily decoded messages reference it without
+    copying, so they must be released before close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b'')
+        with open(path + INDEX_SUFFIX, 'rb') as f:
+            index_size = _valid_index_size(f, size)
+            f.seek(0)
+            index = f.read(index_size)
+        self.records = [LogRecord(*r) for r in _INDEX_RECORD.iter_unpack(index)]
+        self._timestamps = [r.timestamp for r in self.records]
+        self._ordered = all(a <= b for (a, b) in zip(self._timestamps, self._timestamps[1:]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def get_raw(self, n):
+        """Return n-th serialized message as memoryview of mapped file"""
+        r = self.records[n]
+        return self._view[r.offset:r.offset + r.size]
+
+    def get(self, n, lazy=True):
+        """Return n-th message, by default decoded lazily directly from mapped file"""
+        return Message.from_binary(self.get_raw(n), lazy)
+
+    def find(self, message_code=None, message_id=None, start=None, end=None):
+        """Return numbers of messages matching code, id and timestamp range [start, end)"""
+        (first, last) = self._time_range(start, end)
+        result = []
+        for n in range(first, last):
+            r = self.records[n]
+            if message_code is not None and r.message_code != message_code:
+                continue
+            if message_id is not None and r.message_id != message_id:
+                continue
+            if start is not None and r.timestamp < start:
+                continue
+            if end is not None and r.timestamp >= end:
+                continue
+            result.append(n)
+        return result
+
+    def _time_range(self, start, end):
+        """Range of record numbers to scan for timestamps in [start, end)"""
+        if not self._ordered:
+            return (0, len(self.records))
+        first = 0 if start is None else bisect.bisect_left(self._timestamps, start)
+        last = len(self.records) if end is None else bisect.bisect_left(self._timestamps, end)
+        return (first, last)
+
+    def replay(self, target, start=None, end=None, speed=1.0):
+        """
+        Send messages with timestamps in [start, end) to socket (raw data is sent) or
+        pass them to callable (lazily decoded messages), keeping original intervals
+        divided by speed; speed 0 or None replays without delays. Return number of messages.
+        """
+        sendall = getattr(target, 'sendall', None)
+        numbers = self.find(start=start, end=end)
+        started = time.monotonic()
+        origin = self.records[numbers[0]].timestamp if numbers else 0
+        for n in numbers:
+            if speed:
+                delay = (self.records[n].timestamp - origin) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            if sendall is not None:
+                with self.get_raw(n) as data:
+                    sendall(data)
+            else:
+                target(self.get(n))
+        return len(numbers)
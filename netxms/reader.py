@@ -0,0 +1,118 @@
+import struct
+
+from .message import InvalidMessage, Message, MessageTooLarge
+
+_MESSAGE_SIZE = struct.Struct('!I')
+
+class MessageReader():
+    """
+    Incremental NXCP stream framer. Received data is appended to a single bytearray;
+    consumed messages only advance read position and unconsumed tail is moved to
+    the front when more space is needed. Buffer grows by doubling while a large
+    message arrives and shrinks back to buffer_size once it is drained. With MessagePool
+    messages are decoded into pooled objects, which consumer returns with "with message:".
+    """
+    MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, buffer_size=65536, lazy=False, max_message_size=MAX_MESSAGE_SIZE, pool=None, limits=None):
+        self._buffer = bytearray(buffer_size)
+        self._start = 0
+        self._end = 0
+        self._buffer_size = buffer_size
+        self.lazy = lazy
+        self.pool = pool
+        self.limits = limits
+        if limits is not None and limits.max_message_size is not None:
+            max_message_size = limits.max_message_size if max_message_size is None else min(max_message_size, limits.max_message_size)
+        self.max_message_size = max_message_size
+
+    @property
+    def pending(self):
+        return self._end - self._start
+
+    def feed(self, data):
+        """Append received data, return iterator over messages completed so far"""
+        length = len(data)
+        self._reserve(length)
+        self._buffer[self._end:self._end + length] = data
+        self._end += length
+        return self._messages()
+
+    def receive(self, sock):
+        """
+        Read once from blocking socket directly into internal buffer, return iterator over
+        completed messages. Returns None if peer closed connection on message boundary.
+        """
+        missing = self._missing()
+        self._reserve(max(self._buffer_size, min(missing, len(self._buffer))))
+        with memoryview(self._buffer)[self._end:] as view:
+            length = sock.recv_into(view)
+        if length == 0:
+            if self._end != self._start:
+                raise ConnectionError('Connection closed in the middle of message')
+            return None
+        self._end += length
+        return self._messages()
+
+    def _missing(self):
+        """Number of bytes still missing for current message"""
+        pending = self._end - self._start
+        if pending < Message.HEADER_SIZE:
+            return Message.HEADER_SIZE - pending
+        return self._message_size() - pending
+
+    def _message_size(self):
+        size = _MESSAGE_SIZE.unpack_from(self._buffer, self._start + 4)[0]
+        if size < Message.HEADER_SIZE or size % 8 != 0:
+            raise InvalidMessage('Invalid message size (%d)' % size)
+        if self.max_message_size is not None and size > self.max_message_size:
+            raise MessageTooLarge('Message size %d exceeds limit of %d bytes' % (size, self.max_message_size))
+        return size
+
+    def _reserve(self, length):
+        """Make sure at least length bytes can be written after buffered data"""
+        capacity = len(self._buffer)
+        if capacity - self._end >= length:
+            return
+        pending = self._end - self._start
+        if capacity - pending >= length:
+            if pending > 0:
+                with memoryview(self._buffer) as view:
+                    view[0:pending] = view[self._start:self._end]
+        else:
+            # allocate new buffer once and copy only unconsumed bytes
+            buffer = bytearray(max(pending + length, capacity * 2))
+            if pending > 0:
+                with memoryview(self._buffer) as view:
+                    buffer[0:pending] = view[self._start:self._end]
+            self._buffer = buffer
+        self._start = 0
+        self._end = pending
+
+    def _drained(self):
+        self._start = 0
+        self._end = 0
+        if len(self._buffer) > self._buffer_size:
+            self._buffer = bytearray(self._buffer_size)
+
+    def _messages(self):
+        while self._end - self._start >= Message.HEADER_SIZE:
+            size = self._message_size()
+            if self._end - self._start < size:
+                break
+            start = self._start
+            self._start += size
+            with memoryview(self._buffer)[start:start + size] as frame:
+                # lazy message takes own copy of writable frame
+                if self.pool is None:
+                    message = Message.from_binary(frame, self.lazy, self.limits)
+                else:
+                    message = self.pool.acquire()
+                    try:
+                        message.deserialize(frame, self.lazy, self.limits)
+                    except Exception:
+                        self.pool.release(message)
+                        raise
+            if self._start == self._end:
+                self._drained()
+            yield message
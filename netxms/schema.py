@@ -0,0 +1,146 @@
+import operator
+import struct
+
+from .message import FieldType, Flags, Message, MessageField
+
+# fixed-width field: constant part (id, type, padding) packed as single bytes item, then value
+_FIXED_FORMATS = {
+    FieldType.INT16: ('6s', 'H', 8),
+    FieldType.INTEGER: ('8s', 'I4x', 16),
+    FieldType.INT64: ('8s', 'Q', 16),
+    FieldType.FLOAT: ('8s', 'd', 16),
+}
+_VARIABLE_FIELD = struct.Struct('!IBBHI')
+_NOT_PLAIN = Flags.BINARY | Flags.CONTROL | Flags.COMPRESSED
+
+class MessageSchema():
+    """
+    Precompiled encoder/decoder for messages with fixed set of fields. Header and all
+    fixed-width fields are packed with single struct.Struct; on the wire fixed-width fields
+    come first in declared order, followed by variable-length fields.
+    """
+
+    def __init__(self, message_code, fields):
+        self.message_code = message_code
+        self.fields = tuple((field_id, FieldType(field_type)) for (field_id, field_type) in fields)
+
+        fixed = []
+        variable = []
+        for (index, (field_id, field_type)) in enumerate(self.fields):
+            if field_type in _FIXED_FORMATS:
+                fixed.append((index, field_id, field_type))
+            elif field_type in (FieldType.STRING, FieldType.BINARY, FieldType.INETADDR):
+                variable.append((index, field_id, field_type))
+            else:
+                raise RuntimeError('Unsupported field type %s in schema' % field_type)
+
+        fmt = '!HHIII'
+        constants = []
+        self._fixed_size = Message.HEADER_SIZE
+        for (_, field_id, field_type) in fixed:
+            (constant_format, value_format, size) = _FIXED_FORMATS[field_type]
+            fmt += constant_format + value_format
+            constants.append(struct.pack('!IBB', field_id, field_type, 0) + (b'\0\0' if size == 16 else b''))
+            self._fixed_size += size
+        self._struct = struct.Struct(fmt)
+        self._constants = tuple(constants)
+        self._template = [message_code, 0, self._fixed_size, 0, len(self.fields)]
+        for constant in constants:
+            self._template += [constant, 0]
+        self._variable = tuple(variable)
+        self._fixed_indexes = tuple(index for (index, _, _) in fixed)
+        self._fixed_count = len(fixed)
+        self._fixed_values = self._getter(self._fixed_indexes)
+
+    @staticmethod
+    def _getter(indexes):
+        """Return function extracting given items from sequence as tuple"""
+        if not indexes:
+            return lambda values: ()
+        if len(indexes) == 1:
+            index = indexes[0]
+            return lambda values: (values[index],)
+        return operator.itemgetter(*indexes)
+
+    def encode(self, values, message_id=0, flags=0):
+        """Encode values given in declared field order"""
+        if len(values) != len(self.fields):
+            raise RuntimeError('Schema expects %d values, got %d' % (len(self.fields), len(values)))
+        args = self._template.copy()
+        args[3] = message_id
+        args[1] = flags
+        if self._fixed_count > 0:
+            args[6::2] = self._fixed_values(values)
+        if not self._variable:
+            return self._struct.pack(*args)
+
+        encoded = []
+        size = self._fixed_size
+        for (index, field_id, field_type) in self._variable:
+            value = values[index]
+            if field_type == FieldType.INETADDR:
+                field = MessageField(field_id, value, field_type)
+                encoded.append((field, None))
+                size += 32
+            else:
+                data = value.encode('utf-16be') if field_type == FieldType.STRING else value
+                encoded.append((field_id, data))
+                size += (12 + len(data) + 7) & ~7
+        args[2] = size
+        output = bytearray(size)
+        self._struct.pack_into(output, 0, *args)
+        offset = self._fixed_size
+        for ((index, field_id, field_type), (item, data)) in zip(self._variable, encoded):
+            if data is None:
+                offset = item.pack_into(output, offset)
+            else:
+                length = len(data)
+                _VARIABLE_FIELD.pack_into(output, offset, field_id, field_type, 0, 0, length)
+                output[offset + 12:offset + 12 + length] = data
+                # output is zero-filled, padding needs no writes
+                offset += (12 + length + 7) & ~7
+        return bytes(output)
+
+    def decode(self, binary_message):
+        """
+        Decode message into tuple of values in declared field order. Messages with
+        layout other than produced by encode() are decoded with generic decoder;
+        missing fields are returned as None.
+        """
+        with memoryview(binary_message) as view:
+            values = self._decode_fixed(view)
+        if values is not None:
+            return values
+        message = Message.from_binary(binary_message, lazy=True)
+        result = []
+        for (field_id, _) in self.fields:
+            field = message.get(field_id)
+            result.append(None if field is None else field.value)
+        return tuple(result)
+
+    def _decode_fixed(self, view):
+        if len(view) < self._fixed_size:
+            return None
+        unpacked = self._struct.unpack_from(view, 0)
+        (code, flags, size, _, count) = unpacked[:5]
+        if code != self.message_code or count != len(self.fields) or size != len(view) or flags & _NOT_PLAIN:
+            return None
+        if unpacked[5::2] != self._constants:
+            return None
+        if not self._variable:
+            return unpacked[6::2]
+
+        values = [None] * len(self.fields)
+        for (index, value) in zip(self._fixed_indexes, unpacked[6::2]):
+            values[index] = value
+        offset = self._fixed_size
+        try:
+            for (index, field_id, field_type) in self._variable:
+                (field, offset) = MessageField.unpack_from(view, offset)
+                if field.field_id != field_id or field.field_type != field_type or offset > size:
+                    return None
+                values[index] = field.value
+        except struct.error:
+            return None
+        return tuple(values)
+
@@ -0,0 +1,148 @@
+import asyncio
+import collections
+
+from .batch import serialize_batch
+from .reader import MessageReader
+
+class Session(asyncio.Protocol):
+    """
+    Asynchronous NXCP session. Requests are pipelined over single connection and
+    replies are matched to them by message id; messages with unknown id are put
+    into notifications queue. Late replies to requests that timed out or were cancelled
+    are dropped; ids of last MAX_ABANDONED such requests are remembered.
+    """
+    DEFAULT_TIMEOUT = 30
+    MAX_ABANDONED = 1024
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, compression_threshold=None, limits=None):
+        self.timeout = timeout
+        self.compression_threshold = compression_threshold
+        self.notifications = asyncio.Queue()
+        self._pending = {}
+        self._abandoned = collections.OrderedDict()
+        self._next_id = 1
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._reader = MessageReader(limits=limits)
+        self._transport = None
+        self._closed = asyncio.get_running_loop().create_future()
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+
+    @classmethod
+    async def connect(cls, host, port, **kwargs):
+        loop = asyncio.get_running_loop()
+        (_, session) = await loop.create_connection(lambda: cls(**kwargs), host, port)
+        return session
+
+    @property
+    def connected(self):
+        return self._transport is not None
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def data_received(self, data):
+        self.bytes_received += len(data)
+        try:
+            for message in self._reader.feed(data):
+                future = self._pending.pop(message.message_id, None)
+                if future is not None:
+                    if not future.done():
+                        future.set_result(message)
+                elif self._abandoned.pop(message.message_id, None) is None:
+                    self.notifications.put_nowait(message)
+        except RuntimeError as e:
+            # stream is out of sync, it cannot be recovered
+            self._transport.abort()
+            self._fail_pending(ConnectionError('Invalid data received: %s' % e))
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    def connection_lost(self, exc):
+        self._transport = None
+        self._can_write.set()
+        self._fail_pending(ConnectionError('Connection closed') if exc is None else exc)
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def _fail_pending(self, exc):
+        pending = self._pending
+        self._pending = {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def _allocate_id(self):
+        while True:
+            message_id = self._next_id
+            self._next_id = message_id + 1 if message_id < 0xFFFFFFFF else 1
+            if message_id not in self._pending:
+                self._abandoned.pop(message_id, None)
+                return message_id
+
+    def post(self, message):
+        """Send message without waiting for reply, return assigned message id"""
+        if self._transport is None:
+            raise ConnectionError('Session is not connected')
+        message.message_id = self._allocate_id()
+        data = message.serialize(self.compression_threshold)
+        self._transport.write(data)
+        self.bytes_sent += len(data)
+        return message.message_id
+
+    def send(self, message):
+        """Send request, return future resolved with reply message"""
+        message_id = self.post(message)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        return future
+
+    def send_many(self, messages):
+        """Send requests with single writelines() call, return list of futures resolved with replies"""
+        if self._transport is None:
+            raise ConnectionError('Session is not connected')
+        messages = list(messages)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for message in messages:
+            message.message_id = self._allocate_id()
+            future = loop.create_future()
+            self._pending[message.message_id] = future
+            futures.append(future)
+        batch = serialize_batch(messages, self.compression_threshold)
+        self._transport.writelines(batch)
+        self.bytes_sent += sum(len(data) for data in batch)
+        return futures
+
+    async def drain(self):
+        """Wait until transport write buffer is below its high water mark"""
+        await self._can_write.wait()
+        if self._transport is None:
+            raise ConnectionError('Connection closed')
+
+    async def request(self, message, timeout=None):
+        """Send request and wait for reply, raise asyncio.TimeoutError if it does not arrive in time"""
+        future = self.send(message)
+        message_id = message.message_id
+        try:
+            return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+        finally:
+            if self._pending.get(message_id) is future:
+                # reply did not arrive in time
+                del self._pending[message_id]
+                self._abandon(message_id)
+
+    def _abandon(self, message_id):
+        self._abandoned[message_id] = True
+        if len(self._abandoned) > self.MAX_ABANDONED:
+            self._abandoned.popitem(last=False)
+
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+        await self._closed
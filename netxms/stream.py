@@ -0,0 +1,64 @@
+from .message import Flags, Message
+
+DEFAULT_CHUNK_SIZE = 32768
+
+def _read_chunks(source, chunk_size):
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            if len(chunk) <= chunk_size:
+                if chunk:
+                    yield chunk
+                continue
+            with memoryview(chunk) as view:
+                for offset in range(0, len(view), chunk_size):
+                    yield bytes(view[offset:offset + chunk_size])
+
+def iter_binary_messages(source, message_code, message_id=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split file-like object or iterable of bytes into binary stream messages of at most
+    chunk_size bytes each. Data is read one chunk ahead, so only the last message
+    carries END_OF_FILE flag; empty source produces single empty END_OF_FILE message.
+    """
+    chunks = _read_chunks(source, chunk_size)
+    current = next(chunks, b'')
+    while True:
+        following = next(chunks, None)
+        message = Message(message_code, message_id)
+        message.binary_data = current
+        message.flags |= Flags.STREAM
+        if following is None:
+            message.flags |= Flags.END_OF_FILE
+        yield message
+        if following is None:
+            return
+        current = following
+
+class StreamReceiver():
+    """Reassemble binary stream messages into writable file-like object or mmap"""
+
+    def __init__(self, target, message_id=None):
+        self.target = target
+        self.message_id = message_id
+        self.size = 0
+        self.complete = False
+
+    def write(self, message):
+        """Append data from binary message to target, return True when last chunk was received"""
+        if self.complete:
+            raise RuntimeError('Stream is already complete')
+        if not message.binary:
+            raise RuntimeError('Message is not a binary message')
+        if self.message_id is not None and message.message_id != self.message_id:
+            raise RuntimeError('Unexpected message id %d in stream %d' % (message.message_id, self.message_id))
+        data = message.binary_data
+        self.target.write(data)
+        self.size += len(data)
+        if message.flags & Flags.END_OF_FILE:
+            self.complete = True
+        return self.complete
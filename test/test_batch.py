@@ -0,0 +1,118 @@
+import socket
+import threading
+import unittest
+import netxms
+from netxms.batch import BatchWriter, serialize_batch, write_messages
+
+class RecordingSocket():
+    """Accepts at most limit bytes per sendmsg() call, then would block"""
+
+    def __init__(self, limit, block_after=None):
+        self.limit = limit
+        self.block_after = block_after
+        self.data = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        if self.block_after is not None and self.calls >= self.block_after:
+            raise BlockingIOError()
+        self.calls += 1
+        sent = 0
+        for buffer in buffers:
+            chunk = bytes(buffer)[:self.limit - sent]
+            self.data += chunk
+            sent += len(chunk)
+            if sent == self.limit:
+                break
+        return sent
+
+class RecordingTransport():
+    def __init__(self):
+        self.writes = []
+
+    def writelines(self, segments):
+        self.writes.append(list(segments))
+
+def make_messages(count):
+    messages = []
+    for i in range(count):
+        m = netxms.Message(0x1C, i + 1)
+        m.set(1, 'message %d' % i)
+        m.set(2, i)
+        messages.append(m)
+    return messages
+
+class TestBatch(unittest.TestCase):
+    def test_serialize_batch(self):
+        messages = make_messages(5)
+        self.assertEqual(serialize_batch(messages), [m.serialize() for m in messages])
+
+    def test_write_messages(self):
+        transport = RecordingTransport()
+        messages = make_messages(3)
+        write_messages(transport, messages)
+        self.assertEqual(transport.writes, [[m.serialize() for m in messages]])
+
+    def test_partial_writes(self):
+        messages = make_messages(50)
+        sock = RecordingSocket(37)
+        writer = BatchWriter(sock, max_bytes=1 << 20, max_delay=60)
+        writer.add_all(messages)
+        self.assertEqual(sock.calls, 0)
+        self.assertTrue(writer.flush())
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(bytes(sock.data), b''.join(m.serialize() for m in messages))
+
+    def test_size_budget(self):
+        messages = make_messages(20)
+        size = len(messages[0].serialize())
+        sock = RecordingSocket(1 << 20)
+        writer = BatchWriter(sock, max_bytes=size * 5, max_delay=60)
+        writer.add_all(messages)
+        self.assertEqual(sock.calls, 4)
+        self.assertEqual(writer.pending, 0)
+
+    def test_time_budget(self):
+        sock = RecordingSocket(1 << 20)
+        writer = BatchWriter(sock, max_bytes=1 << 20, max_delay=0)
+        writer.add(make_messages(1)[0])
+        self.assertEqual(sock.calls, 1)
+
+    def test_backpressure(self):
+        messages = make_messages(10)
+        size = len(messages[0].serialize())
+        sock = RecordingSocket(size + 3, block_after=1)
+        writer = BatchWriter(sock, max_bytes=1 << 20, max_delay=60, high_water=size * 5)
+        self.assertTrue(writer.add_all(messages[:5]))
+        self.assertFalse(writer.flush())
+        self.assertEqual(writer.pending, size * 4 - 3)
+        self.assertFalse(writer.add_all(messages[5:]))
+        sock.block_after = None
+        sock.limit = 1 << 20
+        self.assertTrue(writer.flush())
+        self.assertEqual(bytes(sock.data), b''.join(m.serialize() for m in messages))
+
+    def test_socketpair(self):
+        messages = make_messages(2000)
+        (left, right) = socket.socketpair()
+        received = []
+
+        def receive():
+            reader = netxms.MessageReader()
+            while len(received) < len(messages):
+                messages_read = reader.receive(right)
+                if messages_read is None:
+                    break
+                received.extend(messages_read)
+
+        thread = threading.Thread(target=receive)
+        thread.start()
+        try:
+            writer = BatchWriter(left, max_bytes=4096)
+            writer.add_all(messages)
+            writer.flush()
+            thread.join(10)
+        finally:
+            left.close()
+            right.close()
+        self.assertEqual([m.get(2).value for m in received], list(range(2000)))
@@ -0,0 +1,72 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+import netxms
+from netxms.decode import decode_file, file_stats, main, scan_frames, split_chunks
+
+class TestDecode(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.nxcp')
+        self.messages = []
+        for i in range(200):
+            m = netxms.Message(100 + i % 2, i)
+            for j in range(i % 5):
+                m.set(j, 'value %d' % j)
+            self.messages.append(m)
+        binary = netxms.Message(300, 500)
+        binary.binary_data = b'abc'
+        self.messages.append(binary)
+        with open(self.path, 'wb') as f:
+            for m in self.messages:
+                f.write(m.serialize())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_scan_frames(self):
+        data = b''.join(m.serialize() for m in self.messages)
+        frames = scan_frames(data)
+        self.assertEqual(len(frames), len(self.messages))
+        self.assertEqual(frames[1], (len(self.messages[0].serialize()), len(self.messages[1].serialize())))
+        with self.assertRaises(RuntimeError):
+            scan_frames(data[:-8])
+        with self.assertRaises(RuntimeError):
+            scan_frames(data + b'\0' * 8)
+
+        chunks = split_chunks(frames, 1000)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(data))
+        self.assertTrue(all(a[1] == b[0] for (a, b) in zip(chunks, chunks[1:])))
+
+    def check_messages(self, decoded):
+        self.assertEqual([m.message_id for m in decoded], [m.message_id for m in self.messages])
+        self.assertEqual([m.serialize() for m in decoded], [m.serialize() for m in self.messages])
+
+    def test_decode_in_process(self):
+        self.check_messages(list(decode_file(self.path, workers=1, chunk_size=512)))
+
+    def test_decode_parallel(self):
+        self.check_messages(list(decode_file(self.path, workers=2, chunk_size=512)))
+        stats = file_stats(self.path, workers=2, chunk_size=512)
+        self.assertEqual(stats, file_stats(self.path, workers=1))
+        self.assertEqual(stats[100]['count'], 100)
+        self.assertEqual(stats[101]['fields'], sum(i % 5 for i in range(1, 200, 2)))
+        self.assertEqual(stats[300], {'count': 1, 'bytes': 24, 'fields': 0})
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(main([self.path, '--workers', '1']), 0)
+        self.assertIn('0x64', output.getvalue())
+        empty = os.path.join(self.directory, 'empty')
+        open(empty, 'wb').close()
+        self.assertEqual(file_stats(empty), {})
+        for workers in ('0', '-2', 'x'):
+            with redirect_stderr(io.StringIO()) as errors, self.assertRaises(SystemExit) as cm:
+                main([self.path, '--workers', workers])
+            self.assertEqual(cm.exception.code, 2)
+            self.assertIn('--workers', errors.getvalue())
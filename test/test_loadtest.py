@@ -0,0 +1,80 @@
+import asyncio
+import contextlib
+import io
+import unittest
+import netxms
+from netxms.loadtest import CMD_NOTIFY, CMD_REQUEST_COMPLETED, LoadResult, MockServer, echo, fill_message, main, run_load
+from netxms.session import Session
+
+CMD_GET_OBJECT = 0x0100
+CMD_IGNORED = 0x0101
+
+class TestMockServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        canned = netxms.Message(CMD_REQUEST_COMPLETED)
+        canned.set(1, 'canned')
+        self.server = MockServer({CMD_GET_OBJECT: canned, CMD_IGNORED: lambda request: None, 0x0102: echo})
+        await self.server.start()
+        self.session = await Session.connect('127.0.0.1', self.server.port, timeout=5)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.close()
+
+    async def test_replies(self):
+        reply = await self.session.request(netxms.Message(CMD_GET_OBJECT))
+        self.assertEqual(reply.get(1).value, 'canned')
+        replies = await asyncio.gather(*[self.session.request(netxms.Message(CMD_GET_OBJECT)) for _ in range(50)])
+        self.assertEqual(len(set(r.message_id for r in replies)), 50)
+
+        reply = await self.session.request(netxms.Message(0x0003))
+        self.assertEqual((reply.message_code, reply.fields), (CMD_REQUEST_COMPLETED, {}))
+
+        request = fill_message(netxms.Message(0x0102), 8)
+        reply = await self.session.request(request)
+        self.assertEqual([f.value for f in reply.fields.values()], [f.value for f in request.fields.values()])
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.session.request(netxms.Message(CMD_IGNORED), timeout=0.1)
+        self.assertEqual(self.server.requests, 54)
+        self.assertEqual(self.server.bytes_received, self.session.bytes_sent)
+        self.assertEqual(self.server.bytes_sent, self.session.bytes_received)
+
+    async def test_flood(self):
+        await self.server.wait_for_clients(1, 5)
+        notification = netxms.Message(CMD_NOTIFY)
+        notification.set(1, 7)
+        self.assertEqual(await self.server.flood(notification, 1000), 1000)
+        for _ in range(1000):
+            received = await asyncio.wait_for(self.session.notifications.get(), 5)
+        self.assertEqual((received.message_code, received.get(1).value), (CMD_NOTIFY, 7))
+
+class TestLoadGenerator(unittest.IsolatedAsyncioTestCase):
+    async def test_run_load(self):
+        async with MockServer() as server:
+            result = await run_load('127.0.0.1', server.port, sessions=4, requests=50, concurrency=3)
+        self.assertEqual((result.requests, result.errors), (200, 0))
+        self.assertEqual(server.requests, 200)
+        self.assertEqual(result.bytes_sent, server.bytes_received)
+        self.assertGreater(result.bytes_received, 0)
+        self.assertGreater(result.requests_per_second, 0)
+        self.assertLessEqual(result.p50, result.p99)
+        self.assertIn('requests/s', result.report())
+
+    async def test_errors(self):
+        async with MockServer(default_reply=None) as server:
+            result = await run_load('127.0.0.1', server.port, sessions=1, requests=2, timeout=0.05)
+        self.assertEqual((result.requests, result.errors, result.p99), (0, 2, None))
+
+class TestLoadResult(unittest.TestCase):
+    def test_percentiles(self):
+        result = LoadResult(1, 2.0, [i / 1000.0 for i in range(100, 0, -1)], 0, 0, 100, 300)
+        self.assertEqual((result.p50, result.p99, result.percentile(100)), (0.05, 0.099, 0.1))
+        self.assertEqual((result.requests_per_second, result.bytes_per_second), (50.0, 200.0))
+
+    def test_command_line(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(main(['--sessions', '2', '--requests', '20', '--fields', '4', '--reply-fields', '4', '--flood', '100']), 0)
+        self.assertIn('requests:      40 (0 errors)', output.getvalue())
+        self.assertIn('latency p99', output.getvalue())
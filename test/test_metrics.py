@@ -0,0 +1,77 @@
+import unittest
+import netxms
+from netxms import metrics
+
+class TestMetrics(unittest.TestCase):
+    def tearDown(self):
+        metrics.disable()
+
+    def make_message(self, code):
+        m = netxms.Message(code, 1)
+        m.set(1, "Test")
+        m.set(2, 2)
+        return m
+
+    def test_disabled_restores_methods(self):
+        original = netxms.Message.serialize
+        metrics.enable()
+        self.assertIsNot(netxms.Message.serialize, original)
+        metrics.disable()
+        self.assertIs(netxms.Message.serialize, original)
+        self.assertFalse(metrics.enabled())
+
+    def test_counters(self):
+        collected = metrics.enable()
+        data = self.make_message(100).serialize()
+        self.make_message(100).serialize()
+        buffer = bytearray(len(data))
+        self.make_message(200).serialize_into(buffer)
+        netxms.Message.from_binary(data)
+        netxms.Message.from_binary(bytearray(data), lazy=True)
+        control = netxms.Message(300)
+        control.control_data = 1
+        control.serialize()
+
+        snapshot = collected.snapshot()
+        encode = snapshot['encode']
+        self.assertEqual(encode[100]['count'], 2)
+        self.assertEqual(encode[100]['bytes'], 2 * len(data))
+        self.assertEqual(encode[100]['fields'], 4)
+        self.assertEqual(encode[200]['count'], 1)
+        self.assertEqual(encode[300]['fields'], 0)
+        self.assertEqual(sum(encode[100]['histogram']), 2)
+        self.assertEqual(snapshot['decode'][100]['count'], 2)
+        self.assertEqual(snapshot['decode'][100]['bytes'], 2 * len(data))
+        self.assertEqual(snapshot['decode'][100]['fields'], 4)
+        self.assertNotIn(200, snapshot['decode'])
+
+        # snapshot is a copy
+        snapshot['encode'][100]['count'] = 0
+        self.assertEqual(collected.snapshot()['encode'][100]['count'], 2)
+        collected.reset()
+        self.assertEqual(collected.snapshot(), {'encode': {}, 'decode': {}})
+
+    def test_callback(self):
+        events = []
+        metrics.enable(metrics.CodecMetrics(lambda *event: events.append(event)))
+        data = self.make_message(100).serialize()
+        self.assertEqual(len(events), 1)
+        (direction, code, size, fields, elapsed) = events[0]
+        self.assertEqual((direction, code, size, fields), ('encode', 100, len(data), 2))
+        self.assertGreaterEqual(elapsed, 0)
+
+    def test_profile(self):
+        collected = metrics.enable()
+        with metrics.profile() as profiled:
+            self.make_message(100).serialize()
+        self.make_message(100).serialize()
+        self.assertEqual(profiled.snapshot()['encode'][100]['count'], 1)
+        self.assertEqual(collected.snapshot()['encode'][100]['count'], 2)
+        self.assertTrue(metrics.enabled())
+
+        original = netxms.Message.deserialize
+        metrics.disable()
+        self.assertIsNot(netxms.Message.deserialize, original)
+        with metrics.profile():
+            pass
+        self.assertFalse(metrics.enabled())
@@ -0,0 +1,96 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+import netxms
+from netxms.msglog import INDEX_SUFFIX, MessageLogReader, MessageLogWriter
+
+def make_message(code, message_id, value):
+    m = netxms.Message(code, message_id)
+    m.set(1, value)
+    m.set(2, 'value %d' % value)
+    return m
+
+class TestMessageLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'traffic.nxcp')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_log(self, count, start=1000.0):
+        with MessageLogWriter(self.path) as writer:
+            for i in range(count):
+                writer.write(make_message(100 + i % 3, i, i), timestamp=start + i * 0.01)
+
+    def test_write_read(self):
+        self.write_log(30)
+        with MessageLogWriter(self.path) as writer:
+            record = writer.write(make_message(200, 99, 99).serialize(), timestamp=2000.0)
+            with self.assertRaises(RuntimeError):
+                writer.write(b'\0' * 8)
+        self.assertEqual((record.message_code, record.message_id), (200, 99))
+
+        with MessageLogReader(self.path) as log:
+            self.assertEqual(len(log), 31)
+            with log.get_raw(5) as raw:
+                self.assertEqual(bytes(raw), make_message(102, 5, 5).serialize())
+            m = log.get(30)
+            self.assertEqual((m.message_code, m.message_id, m.get(2).value), (200, 99, 'value 99'))
+            del m
+            # concatenated data file is plain NXCP stream
+            with open(self.path, 'rb') as f:
+                messages = list(netxms.MessageReader().feed(f.read()))
+            self.assertEqual([m.message_id for m in messages], list(range(30)) + [99])
+
+    def test_find(self):
+        self.write_log(30)
+        with MessageLogReader(self.path) as log:
+            self.assertEqual(log.find(message_code=101), list(range(1, 30, 3)))
+            self.assertEqual(log.find(message_id=7), [7])
+            self.assertEqual(log.find(start=1000.1, end=1000.15), [10, 11, 12, 13, 14])
+            self.assertEqual(log.find(message_code=100, start=1000.1, end=1000.2), [12, 15, 18])
+            self.assertEqual(log.find(message_code=999), [])
+
+    def test_interrupted_write(self):
+        self.write_log(10)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 10)
+        with open(self.path + INDEX_SUFFIX, 'ab') as f:
+            f.write(b'\1\2\3')
+        with MessageLogReader(self.path) as log:
+            self.assertEqual(len(log), 9)
+        with MessageLogWriter(self.path) as writer:
+            self.assertEqual(writer.write(make_message(100, 50, 50)).message_id, 50)
+        with MessageLogReader(self.path) as log:
+            # truncated message data stays in data file, but is not indexed
+            self.assertEqual(len(log), 10)
+            self.assertEqual(log.get(9).get(1).value, 50)
+
+    def test_empty(self):
+        MessageLogWriter(self.path).close()
+        with MessageLogReader(self.path) as log:
+            self.assertEqual(len(log), 0)
+            self.assertEqual(log.replay(lambda m: None), 0)
+
+    def test_replay(self):
+        self.write_log(30)
+        received = []
+        with MessageLogReader(self.path) as log:
+            count = log.replay(lambda m: received.append(m.get(1).value), start=1000.1, speed=0)
+            self.assertEqual(count, 20)
+            self.assertEqual(received, list(range(10, 30)))
+
+            (left, right) = socket.socketpair()
+            with left, right:
+                self.assertEqual(log.replay(left, end=1000.05, speed=10), 5)
+                left.shutdown(socket.SHUT_WR)
+                data = b''
+                while True:
+                    chunk = right.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+            self.assertEqual([m.message_id for m in netxms.MessageReader().feed(data)], list(range(5)))
@@ -1,6 +1,13 @@
+import array
+import concurrent.futures
+import importlib.util
 import unittest
 import netxms
 import ipaddress
+import os
+import random
+import struct
+import zlib
 
 class TestNXCPMessage(unittest.TestCase):
     def test_flags(self):
@@ -181,6 +188,25 @@ class TestNXCPMessage(unittest.TestCase):
         self.assertEqual(f.field_type, netxms.message.FieldType.INETADDR)
         self.assertEqual(f.value, ipaddress.IPv6Network('2001:db8::1/128'))
 
+    def test_field_inetaddr_prefix(self):
+        m = netxms.Message(100, 200)
+        m.set(1, ipaddress.IPv4Network('10.0.0.0/8'))
+        m.set(2, ipaddress.IPv6Network('2001:db8::/32'))
+        m.set(3, ipaddress.IPv4Address('192.168.1.1'))
+        for lazy in (False, True):
+            decoded = netxms.Message.from_binary(m.serialize(), lazy=lazy)
+            self.assertEqual(decoded.get(1).value, ipaddress.IPv4Network('10.0.0.0/8'))
+            self.assertEqual(decoded.get(2).value, ipaddress.IPv6Network('2001:db8::/32'))
+            self.assertEqual(decoded.get(3).value, ipaddress.IPv4Network('192.168.1.1/32'))
+
+        # host address with network mask, invalid mask
+        data = bytearray(m.serialize())
+        data[24:28] = b'\x0a\x01\x02\x03'
+        self.assertEqual(netxms.Message.from_binary(data).get(1).value, ipaddress.IPv4Network('10.0.0.0/8'))
+        data[41] = 33
+        with self.assertRaises(netxms.message.InvalidMessage):
+            netxms.Message.from_binary(data)
+
     def test_serialize_multuple_fields(self):
         test_data = b"\x00\x64\x00\x00\x00\x00\x00\x60\x00\x00\x00\xc8\x00\x00\x00\x04\x00\x00\x01\x2c\x01\x00\x00\x00\x00\x00\x00\x16\x00\x54\x00\x65\x00\x73\x00\x74\x00\x20\x00\x53\x00\x74\x00\x72\x00\x69\x00\x6e\x00\x67\x00\x00\x00\x00\x00\x00\x00\x00\x01\x2d\x03\x00\x03\xe8\x00\x00\x01\x2e\x00\x00\x00\x00\x00\x00\x03\xe9\x00\x00\x00\x00\x00\x00\x01\x2f\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x03\xea"
 
@@ -217,3 +243,615 @@ class TestNXCPMessage(unittest.TestCase):
         self.assertEqual(f.field_id, 303)
         self.assertEqual(f.field_type, netxms.message.FieldType.INT64)
         self.assertEqual(f.value, 1002)
+
+    def test_deserialize_buffer_types(self):
+        test_data = b"\x00\x64\x00\x00\x00\x00\x00\x60\x00\x00\x00\xc8\x00\x00\x00\x04\x00\x00\x01\x2c\x01\x00\x00\x00\x00\x00\x00\x16\x00\x54\x00\x65\x00\x73\x00\x74\x00\x20\x00\x53\x00\x74\x00\x72\x00\x69\x00\x6e\x00\x67\x00\x00\x00\x00\x00\x00\x00\x00\x01\x2d\x03\x00\x03\xe8\x00\x00\x01\x2e\x00\x00\x00\x00\x00\x00\x03\xe9\x00\x00\x00\x00\x00\x00\x01\x2f\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x03\xea"
+        for buffer in (bytearray(test_data), memoryview(test_data)):
+            m = netxms.Message.from_binary(buffer)
+            self.assertEqual(m.get(300).value, "Test String")
+            self.assertEqual(m.get(301).value, 1000)
+            self.assertEqual(m.get(302).value, 1001)
+            self.assertEqual(m.get(303).value, 1002)
+
+        # source buffer must not stay locked after decoding
+        buffer = bytearray(test_data)
+        netxms.Message.from_binary(buffer)
+        buffer.extend(b'\x00')
+
+    def test_field_unpack_from(self):
+        test_data = b"\xff\xff\xff\x00\x00\x01\x2d\x03\x00\x03\xe8\x00\x00\x01\x2c\x01\x00\x00\x00\x00\x00\x00\x02\x00\x41\x00\x00\x00\x00\x00\x00"
+        (f, offset) = netxms.message.MessageField.unpack_from(test_data, 3)
+        self.assertEqual(f.field_id, 301)
+        self.assertEqual(f.value, 1000)
+        self.assertEqual(offset, 11)
+        (f, offset) = netxms.message.MessageField.unpack_from(memoryview(test_data), offset)
+        self.assertEqual(f.field_id, 300)
+        self.assertEqual(f.value, "A")
+        self.assertEqual(offset, 27)
+
+    def test_deserialize_many_fields(self):
+        m = netxms.Message(100, 200)
+        for i in range(1000):
+            m.set(1000 + i, "Value %d" % i if i % 2 else i)
+        serialized = m.serialize()
+        m = netxms.Message.from_binary(serialized)
+        self.assertEqual(len(m.fields), 1000)
+        self.assertEqual(m.get(1000).value, 0)
+        self.assertEqual(m.get(1999).value, "Value 999")
+
+    def test_deserialize_truncated(self):
+        test_data = b"\x00\x64\x00\x00\x00\x00\x00\x18\x00\x00\x00\xc8\x00\x00\x00\x02\x00\x00\x01\x2d\x03\x00\x03\xe8"
+        with self.assertRaises(RuntimeError):
+            netxms.Message.from_binary(test_data)
+
+    def test_serialize_into(self):
+        test_data = b"\x00\x64\x00\x00\x00\x00\x00\x60\x00\x00\x00\xc8\x00\x00\x00\x04\x00\x00\x01\x2c\x01\x00\x00\x00\x00\x00\x00\x16\x00\x54\x00\x65\x00\x73\x00\x74\x00\x20\x00\x53\x00\x74\x00\x72\x00\x69\x00\x6e\x00\x67\x00\x00\x00\x00\x00\x00\x00\x00\x01\x2d\x03\x00\x03\xe8\x00\x00\x01\x2e\x00\x00\x00\x00\x00\x00\x03\xe9\x00\x00\x00\x00\x00\x00\x01\x2f\x02\x00\x00\x00\x00\x00\x00\x00\x00\x00\x03\xea"
+
+        m = netxms.Message(100, 200)
+        m.set(300, "Test String")
+        m.set_int16(301, 1000)
+        m.set(302, 1001)
+        m.set_int64(303, 1002)
+        self.assertEqual(m.serialized_size(), len(test_data))
+
+        # reused buffer with garbage must be fully overwritten, including padding
+        buffer = bytearray(b'\xff' * (len(test_data) + 8))
+        size = m.serialize_into(buffer, 8)
+        self.assertEqual(size, len(test_data))
+        self.assertEqual(buffer[8:], test_data)
+        self.assertEqual(buffer[:8], b'\xff' * 8)
+
+        with self.assertRaises(RuntimeError):
+            m.serialize_into(bytearray(len(test_data) - 1))
+        with self.assertRaises(RuntimeError):
+            m.serialize_into(bytearray(len(test_data) + 8), -8)
+
+        # size and offset are in bytes regardless of buffer item size
+        words = memoryview(bytearray(len(test_data) + 8)).cast('I')
+        self.assertEqual(m.serialize_into(words, 8), len(test_data))
+        self.assertEqual(words.tobytes()[8:], test_data)
+        words = memoryview(bytearray(len(test_data))).cast('I')
+        with self.assertRaises(RuntimeError):
+            m.serialize_into(words, 8)
+
+        m = netxms.Message(100)
+        m.binary_data = b'1234567890123456789'
+        buffer = bytearray(b'\xff' * 40)
+        self.assertEqual(m.serialize_into(buffer), 40)
+        self.assertEqual(buffer, m.serialize())
+
+    def test_serialize_field_padding(self):
+        for length in range(0, 17):
+            f = netxms.message.MessageField(1, 'x' * length)
+            serialized = f.serialize()
+            self.assertEqual(len(serialized) % 8, 0)
+            self.assertEqual(len(serialized), (12 + length * 2 + 7) & ~7)
+            self.assertEqual(netxms.message.MessageField.from_binary(serialized)[0].value, 'x' * length)
+
+    def test_deserialize_lazy(self):
+        m = netxms.Message(100, 200)
+        m.set(300, "Test String")
+        m.set_int16(301, 1000)
+        m.set(302, 1001)
+        m.set_int64(303, 1002)
+        m.set(304, 1.5)
+        m.set(305, b"\x01\x02\x03")
+        m.set(306, ipaddress.IPv4Network('1.2.3.4/32'))
+        serialized = m.serialize()
+
+        m = netxms.Message.from_binary(serialized, lazy=True)
+        self.assertEqual(m.message_code, 100)
+        self.assertEqual(m.message_id, 200)
+        self.assertEqual(len(m._fields), 0)
+        self.assertEqual(m.get(302).value, 1001)
+        self.assertEqual(len(m._fields), 1)
+        self.assertIs(m.get(302), m.get(302))
+        self.assertIsNone(m.get(400))
+        m.set(300, "Replaced")
+        self.assertEqual(m.get(300).value, "Replaced")
+
+        self.assertEqual(len(m.fields), 7)
+        self.assertIsNone(m._index)
+        self.assertEqual(m.get(301).field_type, netxms.message.FieldType.INT16)
+        self.assertEqual(m.get(303).value, 1002)
+        self.assertEqual(m.get(304).value, 1.5)
+        self.assertEqual(m.get(305).value, b"\x01\x02\x03")
+        self.assertEqual(m.get(306).value, ipaddress.IPv4Network('1.2.3.4/32'))
+
+        m = netxms.Message.from_binary(serialized, lazy=True)
+        self.assertEqual(m.get(300).value, "Test String")
+        self.assertEqual(m.serialize(), serialized)
+
+    def test_deserialize_lazy_truncated(self):
+        test_data = b"\x00\x64\x00\x00\x00\x00\x00\x18\x00\x00\x00\xc8\x00\x00\x00\x02\x00\x00\x01\x2d\x03\x00\x03\xe8"
+        with self.assertRaises(RuntimeError):
+            netxms.Message.from_binary(test_data, lazy=True)
+
+    def test_deserialize_lazy_decode_error(self):
+        # odd length UTF-16 payload fails on access, and keeps failing on retry
+        test_data = b"\x00\x64\x00\x00\x00\x00\x00\x20\x00\x00\x00\xc8\x00\x00\x00\x01\x00\x00\x01\x2c\x01\x00\x00\x00\x00\x00\x00\x03\x00\x41\x00\x00"
+        m = netxms.Message.from_binary(test_data, lazy=True)
+        with self.assertRaises(netxms.message.InvalidMessage):
+            m.get(300)
+        with self.assertRaises(netxms.message.InvalidMessage):
+            m.get(300)
+
+    def test_deserialize_lazy_writable_buffer(self):
+        m = netxms.Message(100, 200)
+        m.set(300, "Test String")
+        m.set(301, 1001)
+        buffer = bytearray(m.serialize())
+        m = netxms.Message.from_binary(buffer, lazy=True)
+        # writable source is copied: it stays resizable and later edits are not visible
+        buffer[28:30] = b'\x00\x58'
+        buffer.extend(b'\x00' * 8)
+        self.assertEqual(m.get(300).value, "Test String")
+        self.assertEqual(m.get(301).value, 1001)
+
+    def test_deserialize_lazy_replace_fields(self):
+        m = netxms.Message(100, 200)
+        m.set(1, "Test String")
+        m.set(2, 1001)
+        m.set_range(10, [1, 2, 3])
+        serialized = m.serialize()
+        m = netxms.Message.from_binary(serialized, lazy=True)
+        m.fields = {}
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).fields, {})
+        m = netxms.Message(100, 200)
+        m.set_range(10, [1, 2, 3])
+        m.fields = {3: netxms.message.MessageField(3, 5)}
+        self.assertEqual(list(netxms.Message.from_binary(m.serialize()).fields), [3])
+
+    def make_object_list(self, count):
+        m = netxms.Message(100, 200)
+        for i in range(count):
+            m.set(1000 + i * 2, "Object %d" % (i % 10))
+            m.set(1001 + i * 2, i)
+        return m
+
+    def test_serialize_compressed(self):
+        m = self.make_object_list(100)
+        uncompressed = m.serialize()
+        self.assertEqual(m.serialize(compression_threshold=len(uncompressed)), uncompressed)
+
+        compressed = m.serialize(compression_threshold=128)
+        self.assertLess(len(compressed), len(uncompressed))
+        self.assertEqual(len(compressed) % 8, 0)
+        (code, flags, size, message_id, count, original_size) = struct.unpack_from('!HHIIII', compressed)
+        self.assertEqual((code, message_id, count), (100, 200, 200))
+        self.assertEqual(flags, netxms.message.Flags.COMPRESSED)
+        self.assertEqual(size, len(compressed))
+        self.assertEqual(original_size, len(uncompressed))
+        self.assertEqual(zlib.decompress(compressed[20:]), uncompressed[16:])
+        self.assertEqual(m.flags, 0)
+
+        buffer = bytearray(len(uncompressed))
+        size = m.serialize_into(buffer, 0, compression_threshold=128)
+        self.assertEqual(buffer[:size], compressed)
+
+        # incompressible payload is sent as is
+        m = netxms.Message(100, 200)
+        m.set(1, os.urandom(1024))
+        self.assertEqual(m.serialize(compression_threshold=0), m.serialize())
+
+    def test_deserialize_compressed(self):
+        compressed = self.make_object_list(100).serialize(compression_threshold=128)
+        for lazy in (False, True):
+            m = netxms.Message.from_binary(compressed, lazy=lazy)
+            self.assertEqual(m.flags, 0)
+            self.assertEqual(m.get(1000).value, "Object 0")
+            self.assertEqual(m.get(1199).value, 99)
+            self.assertEqual(len(m.fields), 200)
+
+        corrupted = bytearray(compressed)
+        corrupted[24:32] = b'\xff' * 8
+        with self.assertRaises(RuntimeError):
+            netxms.Message.from_binary(corrupted)
+
+        # declared uncompressed size is smaller than actual data
+        corrupted = bytearray(compressed)
+        corrupted[16:20] = struct.pack('!I', 64)
+        with self.assertRaises(RuntimeError):
+            netxms.Message.from_binary(corrupted)
+
+    def test_set_range(self):
+        values = [1, 2, 0xFFFFFFFF, 4]
+        for (field_type, setter) in ((netxms.message.FieldType.INTEGER, netxms.Message.set),
+                (netxms.message.FieldType.INT64, netxms.Message.set_int64),
+                (netxms.message.FieldType.INT16, netxms.Message.set_int16),
+                (netxms.message.FieldType.FLOAT, netxms.Message.set)):
+            if field_type == netxms.message.FieldType.INT16:
+                values = [1, 2, 0xFFFF, 4]
+            elif field_type == netxms.message.FieldType.FLOAT:
+                values = [1.5, -2.0, 1e100, 0.0]
+            expected = netxms.Message(100, 200)
+            expected.set(10, "before")
+            for (i, v) in enumerate(values):
+                setter(expected, 1000 + i, v)
+            expected.set(2000, "after")
+
+            m = netxms.Message(100, 200)
+            m.set(10, "before")
+            m.set(2000, "after")
+            m.set_range(1000, values, field_type)
+            self.assertEqual(m.serialize(), expected.serialize())
+            self.assertEqual(list(m.get_range(1000, 4, field_type)), values)
+            self.assertEqual(list(m.get_range(1001, 2, field_type)), values[1:3])
+            self.assertEqual(m.get(1002).value, values[2])
+            self.assertEqual(m.serialize(), expected.serialize())
+            self.assertEqual(len(m.fields), 6)
+
+    def test_set_range_overrides(self):
+        m = netxms.Message(100)
+        m.set(1001, "old")
+        m.set_range(1000, array.array('I', [1, 2, 3]))
+        self.assertEqual(m.get(1001).value, 2)
+        m.set(1002, "new")
+        self.assertEqual(m.get(1002).value, "new")
+        m.set_range(1001, [5])
+        self.assertEqual([m.get(i).value for i in (1000, 1001, 1002)], [1, 5, "new"])
+        with self.assertRaises(RuntimeError):
+            m.set_range(1, ["x"], netxms.message.FieldType.STRING)
+
+    def test_get_range(self):
+        m = netxms.Message(100, 200)
+        m.set(10, "before")
+        m.set_range(1000, range(1000))
+        m.set_int64(5000, 1 << 40)
+        m.set_int64(5001, 1 << 41)
+        serialized = m.serialize()
+
+        m = netxms.Message.from_binary(serialized, lazy=True)
+        values = m.get_range(1000, 1000)
+        self.assertIsInstance(values, array.array)
+        self.assertEqual(list(values), list(range(1000)))
+        # converted in bulk, no fields were created
+        self.assertEqual(len(m._fields), 0)
+        self.assertEqual(list(m.get_range(5000, 2, netxms.message.FieldType.INT64)), [1 << 40, 1 << 41])
+
+        # field changed after decoding must not be read from original buffer
+        m.set(1500, 7)
+        self.assertEqual(m.get_range(1499, 3)[1], 7)
+
+        # field by field fallback
+        m = netxms.Message.from_binary(serialized)
+        self.assertEqual(list(m.get_range(1000, 1000)), list(range(1000)))
+        with self.assertRaises(RuntimeError):
+            m.get_range(1999, 2)
+        # type mismatch in encoded run falls back to field values
+        m = netxms.Message.from_binary(serialized, lazy=True)
+        self.assertEqual(list(m.get_range(1000, 2, netxms.message.FieldType.INT64)), [0, 1])
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'NumPy is not installed')
+    def test_get_range_numpy(self):
+        m = netxms.Message(100)
+        m.set_range(1000, [1.5, 2.5], netxms.message.FieldType.FLOAT)
+        values = m.get_range(1000, 2, netxms.message.FieldType.FLOAT, as_numpy=True)
+        self.assertEqual(values.tolist(), [1.5, 2.5])
+
+    def test_serialize_cached(self):
+        def fresh(code, message_id, flags=0):
+            m = netxms.Message(code, message_id)
+            m.flags = flags
+            m.set(1, 'text')
+            m.set(2, 42)
+            return m.serialize()
+
+        m = netxms.Message(100, 1, cache=True)
+        m.set(1, 'text')
+        m.set(2, 42)
+        self.assertEqual(m.serialize(), fresh(100, 1))
+        self.assertIsNotNone(m._encoded)
+        for message_id in (2, 0xFFFFFFFF, 7):
+            m.message_id = message_id
+            self.assertEqual(m.serialize(), fresh(100, message_id))
+        m.message_code = 200
+        self.assertEqual(m.serialize(), fresh(200, 7))
+        m.flags |= netxms.message.Flags.END_OF_SEQUENCE
+        self.assertEqual(m.serialize(), fresh(200, 7, int(netxms.message.Flags.END_OF_SEQUENCE)))
+
+        buffer = bytearray(100)
+        size = m.serialize_into(buffer, 4)
+        self.assertEqual(bytes(buffer[4:4 + size]), m.serialize())
+
+        # compression does not alter cached form
+        m = netxms.Message(100, 1, cache=True)
+        m.set(1, 'x' * 1000)
+        plain = m.serialize()
+        self.assertTrue(len(m.serialize(compression_threshold=100)) < len(plain))
+        self.assertEqual(m.serialize(), plain)
+
+    def test_serialize_not_cached_by_default(self):
+        m = netxms.Message(100, 1)
+        m.set(1, 42)
+        fields = m.fields
+        m.serialize()
+        self.assertIsNone(m._encoded)
+        fields[2] = netxms.message.MessageField(2, 5)
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(2).value, 5)
+        field = m.get(1)
+        m.serialize()
+        field.value = 43
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(1).value, 43)
+
+        m.cache = True
+        m.serialize()
+        self.assertIsNotNone(m._encoded)
+        m.cache = False
+        self.assertIsNone(m._encoded)
+        m.cache = True
+        m.reset(100)
+        self.assertFalse(m.cache)
+
+    def test_serialize_cache_invalidated(self):
+        m = netxms.Message(100, 1, cache=True)
+        m.set(1, 42)
+        m.serialize()
+        m.set(2, 'new')
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(2).value, 'new')
+        m.set_int64(3, 1 << 40)
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(3).value, 1 << 40)
+        m.set_range(10, [1, 2, 3])
+        self.assertEqual(list(netxms.Message.from_binary(m.serialize()).get_range(10, 3)), [1, 2, 3])
+        # fields may be changed in place after get()
+        m.get(1).value = 43
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(1).value, 43)
+        m.fields[4] = netxms.message.MessageField(4, 5)
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).get(4).value, 5)
+
+        m = netxms.Message(100, 1, cache=True)
+        m.binary_data = b'abc'
+        m.serialize()
+        m.binary_data = b'defgh'
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).binary_data, b'defgh')
+        m.binary_data = bytearray(b'xyz')
+        m.serialize()
+        m.binary_data[0] = ord('a')
+        m.invalidate_cache()
+        self.assertEqual(netxms.Message.from_binary(m.serialize()).binary_data, b'ayz')
+
+        m.deserialize(netxms.Message(300, 9).serialize())
+        self.assertEqual(m.serialize(), netxms.Message(300, 9).serialize())
+
+    def test_string_cache(self):
+        m = netxms.Message(100)
+        for i in range(100):
+            m.set(i, 'name %d' % (i % 10))
+        m.set(100, 'x' * 200)
+        data = m.serialize()
+
+        cache = netxms.message.StringCache(maxsize=5)
+        previous = netxms.message.set_string_cache(cache)
+        try:
+            decoded = netxms.Message.from_binary(data)
+            self.assertEqual([decoded.get(i).value for i in range(100)], ['name %d' % (i % 10) for i in range(100)])
+            self.assertEqual(decoded.get(100).value, 'x' * 200)
+            self.assertIs(decoded.get(0).value, decoded.get(10).value)
+        finally:
+            netxms.message.set_string_cache(previous)
+        # values cycle through 10 names, so cache of 5 never hits
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 100, 5))
+
+        cache = netxms.message.StringCache()
+        netxms.message.set_string_cache(cache)
+        try:
+            netxms.Message.from_binary(data, lazy=True).fields
+        finally:
+            netxms.message.set_string_cache(previous)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (90, 10, 10))
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+    def test_reset(self):
+        m = netxms.Message(100, 1)
+        fields = m.fields
+        m.set(5, 'x')
+        m.serialize()
+        m.reset(200, 3)
+        self.assertIs(m.fields, fields)
+        self.assertEqual((m.message_code, m.message_id, m.flags, len(m.fields)), (200, 3, 0, 0))
+        self.assertEqual(m.serialize(), netxms.Message(200, 3).serialize())
+
+        source = netxms.Message(100, 1)
+        source.set(1, 'a')
+        source.set(2, 'b')
+        m = netxms.Message.from_binary(source.serialize(), lazy=True)
+        m.set_range(10, [1, 2])
+        m.reset()
+        self.assertEqual((m.get(1), m.get(10), m.serialized_size()), (None, None, 16))
+
+    def test_pool(self):
+        pool = netxms.MessagePool(maxsize=1)
+        m = pool.acquire(100, 5)
+        self.assertEqual((m.message_code, m.message_id), (100, 5))
+        with m:
+            m.set(1, 1)
+        self.assertEqual(len(pool), 1)
+        with self.assertRaises(RuntimeError):
+            pool.release(m)
+        self.assertIs(pool.acquire(), m)
+        self.assertEqual(len(m.fields), 0)
+        other = pool.acquire()
+        pool.release(m)
+        pool.release(other)
+        self.assertEqual(len(pool), 1)
+        # messages not taken from pool are not affected by with block
+        plain = netxms.Message(1)
+        with plain:
+            plain.set(1, 1)
+        self.assertEqual(plain.get(1).value, 1)
+
+    def fuzz_samples(self):
+        m = netxms.Message(100, 1)
+        m.set(1, 'text value')
+        m.set(2, 12345)
+        m.set_int16(3, 7)
+        m.set_int64(4, 1 << 50)
+        m.set(5, 1.5)
+        m.set(6, b'\x01\x02\x03')
+        m.set(7, ipaddress.ip_network('10.0.0.0/8'))
+        m.set(8, 'x' * 300)
+        binary = netxms.Message(100, 2)
+        binary.binary_data = b'data' * 10
+        return [m.serialize(), m.serialize(compression_threshold=16), binary.serialize()]
+
+    def check_decode(self, data, limits=None):
+        """Decode data eagerly and lazily; only DecodeError may be raised and limits must hold"""
+        for lazy in (False, True):
+            try:
+                m = netxms.Message.from_binary(data, lazy=lazy, limits=limits)
+                fields = m.fields
+            except netxms.DecodeError:
+                continue
+            if limits is not None and not m.binary and not m.control:
+                self.assertLessEqual(len(fields), limits.max_fields)
+                decoded = sum(len(f.value) for f in fields.values() if isinstance(f.value, (str, bytes)))
+                self.assertLessEqual(decoded, limits.max_decoded_size)
+
+    def test_decode_fuzz(self):
+        rng = random.Random(1234)
+        limits = netxms.DecodeLimits(max_message_size=1024, max_fields=5, max_field_size=64, max_decoded_size=100)
+        for data in self.fuzz_samples():
+            for _ in range(1500):
+                mutated = bytearray(data)
+                for _ in range(rng.randint(1, 4)):
+                    mutated[rng.randrange(len(mutated))] = rng.randrange(256)
+                if rng.random() < 0.5:
+                    # keep declared size consistent, so that decoder gets past header checks
+                    struct.pack_into('!I', mutated, 4, len(mutated))
+                self.check_decode(bytes(mutated))
+                self.check_decode(bytes(mutated), limits)
+        for _ in range(3000):
+            data = bytearray(rng.randbytes(rng.choice((8, 16, 24, 64, 256))))
+            if len(data) >= 16 and rng.random() < 0.8:
+                struct.pack_into('!HHI', data, 0, 100, rng.choice((0, 0x40, rng.randrange(0x100))), len(data))
+            self.check_decode(bytes(data))
+            self.check_decode(bytes(data), limits)
+
+    def test_decode_limits(self):
+        # billions of declared fields are rejected before any field is decoded
+        data = struct.pack('!HHIII', 100, 0, 24, 1, 0xFFFFFFFF) + bytes(8)
+        with self.assertRaises(netxms.message.TruncatedMessage):
+            netxms.Message.from_binary(data)
+        with self.assertRaises(netxms.message.TooManyFields):
+            netxms.Message.from_binary(data, limits=netxms.DecodeLimits(max_fields=1000))
+
+        m = netxms.Message(100, 1)
+        m.set(1, 'a' * 100)
+        m.set(2, b'b' * 100)
+        data = m.serialize()
+        with self.assertRaises(netxms.message.MessageTooLarge):
+            netxms.Message.from_binary(data, limits=netxms.DecodeLimits(max_message_size=100))
+        with self.assertRaises(netxms.message.FieldTooLarge):
+            netxms.Message.from_binary(data, lazy=True, limits=netxms.DecodeLimits(max_field_size=150))
+        with self.assertRaises(netxms.message.DecodedSizeExceeded):
+            netxms.Message.from_binary(data, limits=netxms.DecodeLimits(max_decoded_size=250))
+        m = netxms.Message.from_binary(data, limits=netxms.DecodeLimits(400, 2, 200, 300))
+        self.assertEqual(m.get(2).value, b'b' * 100)
+
+        # declared size of compressed payload is checked before decompression
+        data = bytearray(netxms.Message(100, 1).serialize())
+        data += struct.pack('!I', 0xFFFFFFF0) + zlib.compress(b'') + bytes(1)
+        struct.pack_into('!HHI', data, 0, 100, 0x40, len(data))
+        with self.assertRaises(netxms.message.MessageTooLarge):
+            netxms.Message.from_binary(bytes(data), limits=netxms.DecodeLimits(max_message_size=65536))
+
+        binary = netxms.Message(100, 1)
+        binary.binary_data = bytes(1000)
+        with self.assertRaises(netxms.message.DecodedSizeExceeded):
+            netxms.Message.from_binary(binary.serialize(), limits=netxms.DecodeLimits(max_decoded_size=999))
+
+    def test_register_field_type(self):
+        class Point():
+            def __init__(self, x, y):
+                self.x = x
+                self.y = y
+
+        netxms.message.register_field_type(200, lambda v: v.encode('utf-8'), lambda d: d.decode('utf-8'))
+        self.addCleanup(netxms.message.unregister_field_type, 200)
+        netxms.message.register_field_type(201, lambda p: struct.pack('!ii', p.x, p.y), lambda d: Point(*struct.unpack('!ii', d)), Point, size=16)
+        self.addCleanup(netxms.message.unregister_field_type, 201)
+        with self.assertRaises(RuntimeError):
+            netxms.message.register_field_type(netxms.message.FieldType.STRING, str.encode, bytes.decode)
+        with self.assertRaises(RuntimeError):
+            netxms.message.register_field_type(202, bytes, bytes, size=12)
+
+        m = netxms.Message(100, 1)
+        m.set(1, 'utf-8 text', 200)
+        m.set(2, Point(-5, 7))
+        m.set(3, 42)
+        self.assertEqual(m.get(2).field_type, 201)
+        data = m.serialize()
+        self.assertEqual(len(data), 16 + 24 + 16 + 16)
+        for lazy in (False, True):
+            decoded = netxms.Message.from_binary(data, lazy=lazy)
+            self.assertEqual((decoded.get(1).value, decoded.get(1).field_type), ('utf-8 text', 200))
+            self.assertEqual((decoded.get(2).value.x, decoded.get(2).value.y), (-5, 7))
+            self.assertEqual(decoded.get(3).value, 42)
+        with self.assertRaises(RuntimeError):
+            netxms.message.MessageField(1, 'x', 203)
+
+    def test_unregister_field_type(self):
+        netxms.message.register_field_type(210, bytes, bytes, bytearray, size=16)
+        netxms.message.unregister_field_type(210)
+        self.assertEqual(netxms.message.MessageField(1, bytearray(b'abc')).field_type, netxms.message.FieldType.STRING)
+        with self.assertRaises(RuntimeError):
+            netxms.message.MessageField(1, b'x' * 8, 210)
+        with self.assertRaises(RuntimeError):
+            netxms.message.unregister_field_type(210)
+        with self.assertRaises(RuntimeError):
+            netxms.message.unregister_field_type(netxms.message.FieldType.BINARY)
+        # type code can be registered again
+        netxms.message.register_field_type(210, bytes, bytes)
+        netxms.message.unregister_field_type(210)
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(1)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+class TestAsyncCodec(unittest.IsolatedAsyncioTestCase):
+    async def test_from_binary_async(self):
+        m = netxms.Message(100, 1)
+        for i in range(100):
+            m.set(i, 'value %d' % i)
+        data = m.serialize()
+        with CountingExecutor() as executor:
+            small = await netxms.Message.from_binary_async(data, executor=executor)
+            large = await netxms.Message.from_binary_async(data, executor=executor, threshold=len(data) - 1)
+            lazy = await netxms.Message.from_binary_async(memoryview(data), lazy=True, executor=executor, threshold=0)
+            self.assertEqual(executor.calls, 2)
+        for decoded in (small, large, lazy):
+            self.assertEqual(decoded.serialize(), data)
+        with self.assertRaises(netxms.message.TooManyFields):
+            await netxms.Message.from_binary_async(data, limits=netxms.DecodeLimits(max_fields=10), threshold=0)
+
+    async def test_serialize_async(self):
+        m = netxms.Message(100, 1, cache=True)
+        for i in range(100):
+            m.set(i, i)
+        expected = m.serialize()
+        m.invalidate_cache()
+        with CountingExecutor() as executor:
+            self.assertEqual(await m.serialize_async(executor=executor), expected)
+            m.invalidate_cache()
+            self.assertEqual(await m.serialize_async(executor=executor, threshold=100), expected)
+            # cached form is returned inline
+            self.assertEqual(await m.serialize_async(executor=executor, threshold=100), expected)
+            compressed = await m.serialize_async(compression_threshold=64, executor=executor, threshold=0)
+            self.assertEqual(executor.calls, 2)
+        self.assertEqual(netxms.Message.from_binary(compressed).serialize(), expected)
+
+    async def test_serialize_async_large_values(self):
+        m = netxms.Message(100, 1)
+        m.set(1, 'x' * 200000)
+        m.set(2, b'\x01' * 100000)
+        self.assertGreater(m._estimated_size(), 500000)
+        self.assertEqual(netxms.Message.from_binary(m.serialize(), lazy=True)._estimated_size(), m.serialized_size() + 16)
+        with CountingExecutor() as executor:
+            self.assertEqual(await m.serialize_async(executor=executor, threshold=400000), m.serialize())
+            self.assertEqual(executor.calls, 1)
@@ -0,0 +1,150 @@
+import socket
+import threading
+import unittest
+import netxms
+
+class TestMessageReader(unittest.TestCase):
+    def make_message(self, message_id, field_count=3):
+        m = netxms.Message(100, message_id)
+        for i in range(field_count):
+            m.set(1000 + i, "Value %d" % i)
+        return m.serialize()
+
+    def test_feed_single_bytes(self):
+        data = self.make_message(1) + self.make_message(2)
+        reader = netxms.MessageReader(16)
+        messages = []
+        for i in range(len(data)):
+            messages.extend(reader.feed(data[i:i + 1]))
+        self.assertEqual([m.message_id for m in messages], [1, 2])
+        self.assertEqual(messages[1].get(1002).value, "Value 2")
+        self.assertEqual(reader.pending, 0)
+
+    def test_feed_many_messages(self):
+        data = b''.join(self.make_message(i, 1) for i in range(1, 2001))
+        reader = netxms.MessageReader()
+        messages = []
+        for chunk in (data[:1000], data[1000:60001], data[60001:]):
+            messages.extend(reader.feed(chunk))
+        self.assertEqual([m.message_id for m in messages], list(range(1, 2001)))
+
+    def test_feed_large_message(self):
+        data = self.make_message(7, 50000)
+        reader = netxms.MessageReader(1024)
+        messages = []
+        for offset in range(0, len(data), 65536):
+            messages.extend(reader.feed(data[offset:offset + 65536]))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].get(1000 + 49999).value, "Value 49999")
+        # buffer shrinks back once large message is consumed
+        self.assertEqual(len(reader._buffer), 1024)
+
+    def test_partial_tail(self):
+        data = self.make_message(1) + self.make_message(2)
+        reader = netxms.MessageReader()
+        messages = list(reader.feed(data[:-5]))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(reader.pending, len(data) // 2 - 5)
+        messages = list(reader.feed(data[-5:]))
+        self.assertEqual(messages[0].message_id, 2)
+
+    def test_lazy(self):
+        reader = netxms.MessageReader(lazy=True)
+        messages = list(reader.feed(self.make_message(1) + self.make_message(2)))
+        self.assertEqual(messages[0].get(1001).value, "Value 1")
+        self.assertEqual(messages[1].get(1002).value, "Value 2")
+
+    def test_invalid_size(self):
+        reader = netxms.MessageReader()
+        with self.assertRaises(RuntimeError):
+            list(reader.feed(b"\x00\x64\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00"))
+
+    def test_receive(self):
+        data = self.make_message(1, 20000) + self.make_message(2)
+        (server, client) = socket.socketpair()
+        try:
+            def send():
+                server.sendall(data)
+                server.close()
+            sender = threading.Thread(target=send)
+            sender.start()
+            reader = netxms.MessageReader(4096)
+            messages = []
+            while True:
+                received = reader.receive(client)
+                if received is None:
+                    break
+                messages.extend(received)
+            sender.join()
+            self.assertEqual([m.message_id for m in messages], [1, 2])
+        finally:
+            client.close()
+
+    def test_receive_truncated(self):
+        data = self.make_message(1)
+        (server, client) = socket.socketpair()
+        try:
+            server.sendall(data[:-8])
+            server.close()
+            reader = netxms.MessageReader()
+            with self.assertRaises(ConnectionError):
+                while True:
+                    reader.receive(client)
+        finally:
+            client.close()
+
+    def test_max_message_size(self):
+        for size in (0x10000000, 0xFFFFFFF8):
+            reader = netxms.MessageReader(1024)
+            header = b"\x00\x64\x00\x00" + size.to_bytes(4, 'big') + b"\x00\x00\x00\x00\x00\x00\x00\x00"
+            with self.assertRaises(RuntimeError):
+                list(reader.feed(header))
+            self.assertEqual(len(reader._buffer), 1024)
+
+        data = self.make_message(1, 100)
+        reader = netxms.MessageReader(max_message_size=len(data) - 8)
+        with self.assertRaises(RuntimeError):
+            list(reader.feed(data))
+        reader = netxms.MessageReader(max_message_size=None)
+        self.assertEqual(len(list(reader.feed(data))), 1)
+
+    def test_buffer_growth(self):
+        # declared size alone must not allocate whole message
+        data = self.make_message(1, 50000)
+        reader = netxms.MessageReader(1024)
+        self.assertEqual(list(reader.feed(data[:16])), [])
+        self.assertEqual(len(reader._buffer), 1024)
+        self.assertEqual(len(list(reader.feed(data[16:]))), 1)
+
+    def test_pool(self):
+        pool = netxms.MessagePool(maxsize=2)
+        reader = netxms.MessageReader(pool=pool)
+        seen = set()
+        for i in range(10):
+            for message in reader.feed(self.make_message(i, field_count=i % 4)):
+                with message:
+                    self.assertEqual(message.message_id, i)
+                    self.assertEqual(len(message.fields), i % 4)
+                    seen.add(id(message))
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(len(pool), 1)
+
+        # invalid message goes back to pool, not to consumer
+        data = bytearray(self.make_message(1))
+        data[16 + 4] = 99
+        with self.assertRaises(RuntimeError):
+            list(reader.feed(data))
+        self.assertEqual(len(pool), 1)
+
+    def test_limits(self):
+        limits = netxms.DecodeLimits(max_message_size=256, max_fields=2)
+        reader = netxms.MessageReader(limits=limits)
+        self.assertEqual(reader.max_message_size, 256)
+        self.assertEqual(len(list(reader.feed(self.make_message(1, 2)))), 1)
+        with self.assertRaises(netxms.message.TooManyFields):
+            list(reader.feed(self.make_message(2, 3)))
+
+        # oversized message is rejected from header, before its data is buffered
+        reader = netxms.MessageReader(limits=limits)
+        with self.assertRaises(netxms.message.MessageTooLarge):
+            list(reader.feed(self.make_message(3, 40)[:16]))
@@ -0,0 +1,45 @@
+import ipaddress
+import unittest
+import netxms
+from netxms.message import FieldType
+from netxms.schema import MessageSchema
+
+class TestMessageSchema(unittest.TestCase):
+    def test_integer_schema_matches_message(self):
+        schema = MessageSchema(100, [(300, FieldType.INTEGER), (301, FieldType.INT16), (302, FieldType.INT64), (303, FieldType.FLOAT)])
+        m = netxms.Message(100, 200)
+        m.set(300, 1001)
+        m.set_int16(301, 1000)
+        m.set_int64(302, 1002)
+        m.set(303, 1.5)
+        encoded = schema.encode((1001, 1000, 1002, 1.5), 200)
+        self.assertEqual(encoded, m.serialize())
+        self.assertEqual(schema.decode(encoded), (1001, 1000, 1002, 1.5))
+
+    def test_variable_fields(self):
+        schema = MessageSchema(100, [(300, FieldType.STRING), (301, FieldType.INTEGER), (302, FieldType.BINARY),
+            (303, FieldType.INETADDR), (304, FieldType.INT64)])
+        values = ("Test String", 7, b"\x01\x02\x03", ipaddress.IPv4Network('1.2.3.4/32'), 1 << 40)
+        encoded = schema.encode(values, 5)
+        self.assertEqual(len(encoded) % 8, 0)
+        m = netxms.Message.from_binary(encoded)
+        self.assertEqual(m.message_id, 5)
+        self.assertEqual(tuple(m.get(i).value for i in range(300, 305)), values)
+        self.assertEqual(schema.decode(encoded), values)
+
+    def test_decode_other_layout(self):
+        schema = MessageSchema(100, [(300, FieldType.STRING), (301, FieldType.INTEGER), (302, FieldType.INTEGER)])
+        # generic encoder puts fields in id order, schema puts fixed fields first
+        m = netxms.Message(100, 1)
+        m.set(300, "abc")
+        m.set(301, 1)
+        self.assertEqual(schema.decode(m.serialize()), ("abc", 1, None))
+        m.set(302, 2)
+        self.assertEqual(schema.decode(m.serialize(compression_threshold=0)), ("abc", 1, 2))
+
+    def test_invalid(self):
+        with self.assertRaises(RuntimeError):
+            MessageSchema(100, [(1, FieldType.DETECT)])
+        schema = MessageSchema(100, [(1, FieldType.INTEGER)])
+        with self.assertRaises(RuntimeError):
+            schema.encode((1, 2))
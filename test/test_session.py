@@ -0,0 +1,118 @@
+import asyncio
+import collections
+import unittest
+import netxms
+from netxms.session import Session
+
+CMD_REQUEST_COMPLETED = 0x001C
+CMD_KEEPALIVE = 0x0003
+CMD_NOTIFY = 0x004E
+CMD_NO_REPLY = 0x1000
+CMD_DELAYED = 0x1001
+
+class StandInServer(asyncio.Protocol):
+    """Replies to requests in reverse order of arrival, with field 1 echoed back"""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.reader = netxms.MessageReader()
+
+    def data_received(self, data):
+        replies = []
+        for request in self.reader.feed(data):
+            if request.message_code == CMD_NO_REPLY:
+                continue
+            if request.message_code == CMD_DELAYED:
+                reply = netxms.Message(CMD_REQUEST_COMPLETED, request.message_id)
+                asyncio.get_running_loop().call_later(0.2, self.transport.write, reply.serialize())
+                continue
+            if request.message_code == CMD_NOTIFY:
+                notification = netxms.Message(CMD_NOTIFY, 0)
+                notification.set(1, request.get(1).value)
+                replies.append(notification)
+            reply = netxms.Message(CMD_REQUEST_COMPLETED, request.message_id)
+            reply.set(1, request.get(1).value if request.get(1) is not None else 0)
+            replies.append(reply)
+        for reply in reversed(replies):
+            self.transport.write(reply.serialize())
+
+class TestSession(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(StandInServer, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.session = await Session.connect('127.0.0.1', self.port, timeout=5)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def make_request(self, code, value):
+        m = netxms.Message(code)
+        m.set(1, value)
+        return m
+
+    async def test_request(self):
+        reply = await self.session.request(self.make_request(CMD_KEEPALIVE, 42))
+        self.assertEqual(reply.message_code, CMD_REQUEST_COMPLETED)
+        self.assertEqual(reply.get(1).value, 42)
+
+    async def test_pipelined_requests(self):
+        requests = [self.make_request(CMD_KEEPALIVE, i) for i in range(500)]
+        replies = await asyncio.gather(*[self.session.request(r) for r in requests])
+        self.assertEqual([r.get(1).value for r in replies], list(range(500)))
+        self.assertEqual(len(set(r.message_id for r in requests)), 500)
+        self.assertEqual(self.session._pending, {})
+
+    async def test_send_many(self):
+        futures = self.session.send_many(self.make_request(CMD_KEEPALIVE, i) for i in range(300))
+        await self.session.drain()
+        replies = await asyncio.gather(*futures)
+        self.assertEqual([r.get(1).value for r in replies], list(range(300)))
+        self.assertEqual(self.session._pending, {})
+
+    async def test_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.session.request(self.make_request(CMD_NO_REPLY, 1), timeout=0.1)
+        self.assertEqual(self.session._pending, {})
+        reply = await self.session.request(self.make_request(CMD_KEEPALIVE, 2))
+        self.assertEqual(reply.get(1).value, 2)
+
+    async def test_late_reply_dropped(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.session.request(self.make_request(CMD_DELAYED, 1), timeout=0.05)
+        task = asyncio.ensure_future(self.session.request(self.make_request(CMD_DELAYED, 2)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        future = self.session.send(self.make_request(CMD_DELAYED, 3))
+        future.cancel()
+        await asyncio.sleep(0.4)
+        self.assertTrue(self.session.notifications.empty())
+        self.assertEqual((self.session._pending, len(self.session._abandoned)), ({}, 0))
+        reply = await self.session.request(self.make_request(CMD_NOTIFY, 4))
+        notification = await asyncio.wait_for(self.session.notifications.get(), 5)
+        self.assertEqual((reply.get(1).value, notification.get(1).value), (4, 4))
+
+    def test_abandoned_bounded(self):
+        session = Session.__new__(Session)
+        session._abandoned = collections.OrderedDict()
+        for message_id in range(Session.MAX_ABANDONED + 10):
+            session._abandon(message_id)
+        self.assertEqual(list(session._abandoned)[0], 10)
+        self.assertEqual(len(session._abandoned), Session.MAX_ABANDONED)
+
+    async def test_notifications(self):
+        reply = await self.session.request(self.make_request(CMD_NOTIFY, 7))
+        self.assertEqual(reply.get(1).value, 7)
+        notification = await asyncio.wait_for(self.session.notifications.get(), 5)
+        self.assertEqual(notification.message_code, CMD_NOTIFY)
+        self.assertEqual(notification.get(1).value, 7)
+
+    async def test_connection_lost(self):
+        future = self.session.send(self.make_request(CMD_NO_REPLY, 1))
+        self.session._transport.close()
+        with self.assertRaises(ConnectionError):
+            await future
+        with self.assertRaises(ConnectionError):
+            self.session.post(self.make_request(CMD_KEEPALIVE, 1))
@@ -0,0 +1,106 @@
+import io
+import mmap
+import os
+import tracemalloc
+import unittest
+import netxms
+from netxms.message import Flags
+from netxms.stream import StreamReceiver, iter_binary_messages
+
+CMD_FILE_DATA = 0x0029
+
+class ZeroFile(io.RawIOBase):
+    """Readable file of given size that is never held in memory"""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.remaining)
+        buffer[:length] = bytes(length)
+        self.remaining -= length
+        return length
+
+class NullFile():
+    def write(self, data):
+        return len(data)
+
+class TestStream(unittest.TestCase):
+    def test_chunks_and_flags(self):
+        data = os.urandom(10000)
+        messages = list(iter_binary_messages(io.BytesIO(data), CMD_FILE_DATA, 5, chunk_size=4096))
+        self.assertEqual([len(m.binary_data) for m in messages], [4096, 4096, 1808])
+        for m in messages:
+            self.assertTrue(m.binary)
+            self.assertTrue(m.flags & Flags.STREAM)
+            self.assertEqual(m.message_id, 5)
+            self.assertEqual(m.message_code, CMD_FILE_DATA)
+        self.assertEqual([bool(m.flags & Flags.END_OF_FILE) for m in messages], [False, False, True])
+        self.assertEqual(b''.join(m.binary_data for m in messages), data)
+
+    def test_exact_multiple(self):
+        messages = list(iter_binary_messages(io.BytesIO(b'x' * 8192), CMD_FILE_DATA, chunk_size=4096))
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[1].flags & Flags.END_OF_FILE)
+
+    def test_empty_source(self):
+        messages = list(iter_binary_messages(io.BytesIO(), CMD_FILE_DATA))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].binary_data, b'')
+        self.assertTrue(messages[0].flags & Flags.END_OF_FILE)
+
+    def test_iterable_source(self):
+        chunks = [b'abc', b'', b'x' * 10000, b'def']
+        messages = list(iter_binary_messages(iter(chunks), CMD_FILE_DATA, chunk_size=4096))
+        self.assertEqual([len(m.binary_data) for m in messages], [3, 4096, 4096, 1808, 3])
+        self.assertEqual(b''.join(m.binary_data for m in messages), b''.join(chunks))
+
+    def test_receive_through_reader(self):
+        data = os.urandom(100000)
+        reader = netxms.MessageReader()
+        target = io.BytesIO()
+        receiver = StreamReceiver(target, 9)
+        for m in iter_binary_messages(io.BytesIO(data), CMD_FILE_DATA, 9, chunk_size=8192):
+            for received in reader.feed(m.serialize()):
+                complete = receiver.write(received)
+        self.assertTrue(complete)
+        self.assertEqual(receiver.size, len(data))
+        self.assertEqual(target.getvalue(), data)
+        with self.assertRaises(RuntimeError):
+            receiver.write(m)
+
+    def test_receive_into_mmap(self):
+        data = os.urandom(20000)
+        target = mmap.mmap(-1, len(data))
+        try:
+            receiver = StreamReceiver(target)
+            for m in iter_binary_messages(io.BytesIO(data), CMD_FILE_DATA, chunk_size=4096):
+                receiver.write(m)
+            self.assertEqual(target[:], data)
+        finally:
+            target.close()
+
+    def test_wrong_message_id(self):
+        receiver = StreamReceiver(io.BytesIO(), 1)
+        m = next(iter_binary_messages(io.BytesIO(b'abc'), CMD_FILE_DATA, 2))
+        with self.assertRaises(RuntimeError):
+            receiver.write(m)
+
+    def test_flat_memory(self):
+        size = 64 * 1024 * 1024
+        reader = netxms.MessageReader()
+        receiver = StreamReceiver(NullFile())
+        tracemalloc.start()
+        try:
+            for m in iter_binary_messages(ZeroFile(size), CMD_FILE_DATA, chunk_size=65536):
+                for received in reader.feed(m.serialize()):
+                    receiver.write(received)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(receiver.complete)
+        self.assertEqual(receiver.size, size)
+        self.assertLess(peak, 2 * 1024 * 1024)